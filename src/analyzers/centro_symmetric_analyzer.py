@@ -1,11 +1,25 @@
 from core.base_parser import BaseParser
 from utilities.analyzer import get_data_from_coord_axis
+from utilities.kernels import binned_profile, min_max, parallel_statistics, segment_statistics
 import numpy as np
 
+# Classification thresholds for FCC (face-centered cubic) copper
+STRUCTURE_RANGES = {
+    'perfect': (0, 0.5),
+    'partial_defect': (0.5, 3.0),
+    'stacking_fault': (3.0, 5.0),
+    'surface': (5.0, 8.0),
+    'defect': (8.0, float('inf'))
+}
+
+# Sorted lower bounds of the ranges above, used to bucket every atom in a
+# single searchsorted pass (float32 like the parsed CSP column, so
+# searchsorted does not upcast). Bucket 0 holds values below the first range.
+STRUCTURE_EDGES = np.array([min_value for min_value, _ in STRUCTURE_RANGES.values()], dtype=np.float32)
+
 class CentroSymmetricAnalyzer:
     def __init__(self, parser: BaseParser):
         self.parser = parser
-        self._atom_groups = None
         # Defect thresholds for FCC (face-centered cubic) copper
         # Below this is considered perfect crystal
         self.perfect_threshold = 0.5
@@ -14,44 +28,41 @@ class CentroSymmetricAnalyzer:
         # Typical range for stacking faults in FCC
         self.stacking_fault_range = (2.0, 5.0)
         # Classification thresholds
-        self.structure_ranges = {
-            'perfect': (0, 0.5),
-            'partial_defect': (0.5, 3.0),
-            'stacking_fault': (3.0, 5.0),
-            'surface': (5.0, 8.0),
-            'defect': (8.0, float('inf'))
-        }
+        self.structure_ranges = STRUCTURE_RANGES
+        self._structure_edges = STRUCTURE_EDGES
     
     def classify_atoms(self, centro_symmetric_values):
-        classifications = {}
-        for struct_type, (min_value, max_value) in self.structure_ranges.items():
-            mask = (centro_symmetric_values >= min_value) & (centro_symmetric_values < max_value)
-            classifications[struct_type] = mask
-        return classifications
+        bins = np.searchsorted(self._structure_edges, centro_symmetric_values, side='right')
+        return {
+            struct_type: bins == bucket
+            for bucket, struct_type in enumerate(self.structure_ranges, start=1)
+        }
 
     def get_defect_statistics(self, timestep_idx=-1, group=None):
-        timesteps = self.parser.get_timesteps()
-
         centro_symmetric_values = self.parser.get_analysis_data('centro_symmetric', timestep_idx)
 
         if group is not None and group != 'all':
-            data = self.parser.get_data(timestep_idx)
-            group_indices = self.parser.get_atom_group_indices(data)[group]
+            group_indices = self.parser.get_timestep_atom_groups(timestep_idx)[group]
             centro_symmetric_values = centro_symmetric_values[group_indices]
 
-        classifications = self.classify_atoms(centro_symmetric_values)
+        # Moments, extrema and class counts from a single parallel pass over the values
+        total, total_squares, minimum, maximum, bin_counts = parallel_statistics(
+            centro_symmetric_values, self._structure_edges
+        )
+        # Bin 0 collects values below the first range (negative CSP) and is dropped
+        counts = dict(zip(self.structure_ranges.keys(), bin_counts[1:]))
         total_atoms = len(centro_symmetric_values)
+        mean = total / total_atoms
         stats = {
             'total_atoms': total_atoms,
-            'mean': np.mean(centro_symmetric_values),
-            'max': np.max(centro_symmetric_values),
-            'min': np.min(centro_symmetric_values),
-            'std': np.std(centro_symmetric_values),
-            'percent_defect': np.sum(classifications['defect']) * 100 / total_atoms,
+            'mean': mean,
+            'max': maximum,
+            'min': minimum,
+            'std': np.sqrt(max(total_squares / total_atoms - mean * mean, 0.0)),
+            'percent_defect': counts['defect'] * 100 / total_atoms,
         }
 
-        for struct_type, mask in classifications.items():
-            count = np.sum(mask)
+        for struct_type, count in counts.items():
             stats[f'{struct_type}_count'] = count
             stats[f'{struct_type}_percent'] = count * 100 / total_atoms
         
@@ -59,39 +70,32 @@ class CentroSymmetricAnalyzer:
     
     def get_defect_evolution(self, group=None):
         timesteps = self.parser.get_timesteps()
-        all_data = self.parser.get_data()
+        centro_symmetric_values, offsets = self.parser.get_analysis_data_stacked('centro_symmetric', group)
+        total_atoms = np.diff(offsets)
+
+        # Per-frame sums, extrema and class counts, frames processed in parallel
+        totals, _, _, maximums, counts = segment_statistics(
+            centro_symmetric_values, offsets, self._structure_edges
+        )
+        percents = counts[:, 1:] * 100 / total_atoms[:, None]
+        struct_types = list(self.structure_ranges.keys())
+
         evolution = {
-            'mean': [],
-            'max': [],
-            'defect_percent': [],
-            'perfect_percent': [],
-            'stacking_fault_percent': []
+            'mean': totals / total_atoms,
+            'max': maximums,
+            'defect_percent': percents[:, struct_types.index('defect')],
+            'perfect_percent': percents[:, struct_types.index('perfect')],
+            'stacking_fault_percent': percents[:, struct_types.index('stacking_fault')]
         }
-        for idx in range(len(timesteps)):
-            centro_symmetric_values = self.parser.get_analysis_data('centro_symmetric', idx)
-
-            if group is not None and group != 'all':
-                data = self.parser.get_data(idx)
-                group_indices = self.parser.get_atom_group_indices(data)[group]
-                centro_symmetric_values = centro_symmetric_values[group_indices]
-        
-            classifications = self.classify_atoms(centro_symmetric_values)
-            evolution['mean'].append(np.mean(centro_symmetric_values))
-            evolution['max'].append(np.max(centro_symmetric_values))
-            total_atoms = len(centro_symmetric_values)
-            evolution['defect_percent'].append(np.sum(classifications['defect']) * 100 / total_atoms)
-            evolution['perfect_percent'].append(np.sum(classifications['perfect']) * 100 / total_atoms)
-            evolution['stacking_fault_percent'].append(np.sum(classifications['stacking_fault']) * 100 / total_atoms)
         return timesteps, evolution
 
     def get_defect_regions(self, timestep_idx=-1, threshold=None, group=None):
         if threshold is None:
             threshold = self.defect_threshold
-        timesteps = self.parser.get_timesteps()
         centro_symmetric_values = self.parser.get_analysis_data('centro_symmetric', timestep_idx)
         data = self.parser.get_data(timestep_idx)
         if group is not None and group != 'all':
-            group_indices = self.parser.get_atom_group_indices(data)[group]
+            group_indices = self.parser.get_timestep_atom_groups(timestep_idx)[group]
             centro_symmetric_values = centro_symmetric_values[group_indices]
             data = data[group_indices]
         defect_mask = centro_symmetric_values >= threshold
@@ -103,21 +107,14 @@ class CentroSymmetricAnalyzer:
         atoms_spatial_coordinates = self.parser.get_atoms_spatial_coordinates(data)
         coords = get_data_from_coord_axis(axis, atoms_spatial_coordinates)
         centro_symmetric_values = self.parser.get_analysis_data('centro_symmetric', timestep_idx)
-        bins = np.linspace(np.min(coords), np.max(coords), n_bins + 1)
+        low, high = min_max(coords)
+        bins = np.linspace(low, high, n_bins + 1)
         bin_centers = 0.5 * (bins[1:] + bins[:-1])
-        defect_percent = []
-        average_centro_symmetric = []
-        for i in range(n_bins):
-            bin_min = bins[i]
-            bin_max = bins[i + 1]
-            # Atoms in this bin
-            bin_mask = (coords >= bin_min) & (coords < bin_max)
-            bin_centro_symmetric_values = centro_symmetric_values[bin_mask]
-            if len(bin_centro_symmetric_values) > 0:
-                defect_count = np.sum(bin_centro_symmetric_values >= self.defect_threshold)
-                defect_percent.append(defect_count * 100 / len(bin_centro_symmetric_values))
-                average_centro_symmetric.append(np.mean(bin_centro_symmetric_values))
-            else:
-                defect_percent.append(0)
-                average_centro_symmetric.append(0)
-        return bin_centers, defect_percent, average_centro_symmetric
\ No newline at end of file
+        sums, counts, defect_counts = binned_profile(
+            coords, centro_symmetric_values, low, high, n_bins, self.defect_threshold
+        )
+        # Empty bins report 0 for both quantities
+        populated = counts > 0
+        defect_percent = np.divide(defect_counts * 100, counts, out=np.zeros(n_bins), where=populated)
+        average_centro_symmetric = np.divide(sums, counts, out=np.zeros(n_bins), where=populated)
+        return bin_centers, defect_percent, average_centro_symmetric
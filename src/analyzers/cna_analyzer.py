@@ -1,4 +1,6 @@
 from core.base_parser import BaseParser
+from utilities.array_module import get_array_module
+from utilities.segments import segment_bincount
 import cupy as cp
 import numpy as np
 
@@ -24,63 +26,66 @@ class CommonNeighborAnalysisAnalyzer:
             5: 'Other'
         }
     
+    def get_cna_values(self, timestep_idx=-1):
+        # Single access point for the CNA column: the parser's cached uint8 copy
+        return self.parser.get_analysis_data('cna', timestep_idx)
+
     def get_cna_data(self):
         cna_data = []
-        for i in range(len(self.parser.get_timesteps())):
-            cna_data.append(self.parser.get_analysis_data('cna', i))
+        for i in range(self.parser.num_timesteps):
+            cna_data.append(self.get_cna_values(i))
         return cna_data
     
+    def get_structure_count_array(self, timestep_idx=-1):
+        # Atoms per CNA class as a fixed-size array (at least the 6 classes)
+        cna_values = self.get_cna_values(timestep_idx)
+        xp = get_array_module(cna_values)
+        return cp.asnumpy(xp.bincount(xp.asarray(cna_values), minlength=6))
+
     def get_structure_counts(self, timestep_idx=-1):
-        cna_values = self.parser.get_analysis_data('cna', timestep_idx)
-        cna_gpu = cp.asarray(cna_values, dtype=cp.int32)
-        counts_gpu = cp.bincount(cna_gpu, minlength=6)
-        counts = cp.asnumpy(counts_gpu)
+        counts = self.get_structure_count_array(timestep_idx)
         return { i: int(counts[i]) for i in range(counts.shape[0]) }
     
     def get_structure_evolution(self):
-        timesteps = self.parser.get_timesteps()
-        all_counts = []
-        for i in range(len(timesteps)):
-            cna_np = self.parser.get_analysis_data('cna', i)
-            cna_gpu = cp.asarray(cna_np, dtype=cp.int32)
-            all_counts.append(cp.bincount(cna_gpu, minlength=6))
-        counts_matrix = cp.stack(all_counts)
-        totals = counts_matrix.sum(axis=1, keepdims=True)
-        pct_gpu = counts_matrix / totals * 100
-        pct = cp.asnumpy(pct_gpu)
+        cna_np, offsets = self.parser.get_analysis_data_stacked('cna')
+        # Every frame's histogram in one segmented bincount (on the device for
+        # large trajectories) instead of one transfer and kernel per timestep.
+        # Labels beyond the six CNA classes are not counted but still count
+        # towards the frame total.
+        counts = segment_bincount(cna_np, offsets, 6)
+        totals = np.diff(offsets)[:, np.newaxis]
+        pct = np.divide(counts * 100, totals, out=np.full(counts.shape, np.nan), where=totals > 0)
         return { t: pct[:, t].tolist() for t in range(6) }
     
     def get_structure_percentages(self, timestep_idx=-1):
-        counts = self.get_structure_counts(timestep_idx)
-        total = sum(counts.values())
-        percentages = {}
-        for structure_type, count in counts.items():
-            percentages[structure_type] = (count / total) * 100
-        return percentages
+        counts = self.get_structure_count_array(timestep_idx)
+        percentages = counts / counts.sum() * 100
+        return { i: float(percentages[i]) for i in range(percentages.shape[0]) }
     
     def get_spatial_distribution(self, timestep_idx=-1):        
         data = self.parser.get_data(timestep_idx)
         x, y, z = self.parser.get_atoms_spatial_coordinates(data)
-        cna = self.parser.get_analysis_data('cna', timestep_idx)
+        cna = self.get_cna_values(timestep_idx)
 
         return x, y, z, cna
     
     def compare_structures(self, timestep_idx1=0, timestep_idx2=-1):
-        structure_counts1 = self.get_structure_counts(timestep_idx1)
-        structure_counts2 = self.get_structure_counts(timestep_idx2)
-
-        total_atoms1 = sum(structure_counts1.values())
-        total_atoms2 = sum(structure_counts2.values())
+        counts1 = self.get_structure_count_array(timestep_idx1)
+        counts2 = self.get_structure_count_array(timestep_idx2)
 
-        # Combine keys 
-        all_types = sorted(set(list(structure_counts1.keys()) + list(structure_counts2.keys())))
+        # Both histograms cover the same types; pad only if one frame holds
+        # labels beyond the standard classes
+        n_types = max(counts1.shape[0], counts2.shape[0])
+        counts1 = np.pad(counts1, (0, n_types - counts1.shape[0]))
+        counts2 = np.pad(counts2, (0, n_types - counts2.shape[0]))
+        all_types = list(range(n_types))
         comparison = {
             'types': all_types,
             'names': [self.structure_names.get(t, f"Type {t}") for t in all_types],
-            'counts1': [structure_counts1.get(t, 0) for t in all_types],
-            'counts2': [structure_counts2.get(t, 0) for t in all_types],
-            'percentages1': [structure_counts1.get(t, 0)/total_atoms1*100 for t in all_types],
-            'percentages2': [structure_counts2.get(t, 0)/total_atoms2*100 for t in all_types]
+            'counts1': counts1.tolist(),
+            'counts2': counts2.tolist(),
+            'percentages1': (counts1 / counts1.sum() * 100).tolist(),
+            'percentages2': (counts2 / counts2.sum() * 100).tolist()
         }
         
         return comparison
\ No newline at end of file
@@ -1,4 +1,6 @@
 from core.base_parser import BaseParser
+from utilities.array_module import get_array_module
+from utilities.segments import segment_bincount
 import numpy as np
 import cupy as cp
 
@@ -10,27 +12,35 @@ class CoordinationAnalyzer:
         coord_values = self.parser.get_analysis_data('coord', timestep_idx)
         return coord_values
     
-    def get_coord_distribution(self, timestep_idx=-1):
+    def get_coord_histogram(self, timestep_idx=-1):
+        # Coordination numbers are small non-negative integers, so one
+        # bincount and a single transfer of ~15 ints summarize the frame
         coord_np = self.get_coord_data(timestep_idx)
-        coord_gpu = cp.asarray(coord_np)
-        unique_gpu, counts_gpu = cp.unique(coord_gpu, return_counts=True)
-        total = coord_gpu.size
-        percentages_gpu = counts_gpu / total * 100
-        unique = cp.asnumpy(unique_gpu)
-        counts = cp.asnumpy(counts_gpu)
-        percentages = cp.asnumpy(percentages_gpu)
+        xp = get_array_module(coord_np)
+        return cp.asnumpy(xp.bincount(xp.asarray(coord_np), minlength=14))
+
+    def get_coord_distribution(self, timestep_idx=-1):
+        all_counts = self.get_coord_histogram(timestep_idx)
+        total = all_counts.sum()
+        unique = np.flatnonzero(all_counts)
+        counts = all_counts[unique]
+        percentages = counts / total * 100
         return unique, counts, percentages
     
     def get_coord_stats(self, timestep_idx=-1):
-        coord_np = self.get_coord_data(timestep_idx)
-        coord_gpu = cp.asarray(coord_np)
-        mean = float(cp.mean(coord_gpu).get())
-        median = float(cp.median(coord_gpu).get())
-        std = float(cp.std(coord_gpu).get())
+        # Every statistic is derived on the host from the histogram
+        hist = self.get_coord_histogram(timestep_idx)
+        values = np.arange(hist.size)
+        total = hist.sum()
+        mean = float((values * hist).sum() / total)
+        std = float(np.sqrt(((values - mean) ** 2 * hist).sum() / total))
+        # Median as the average of the two middle ranks, like np.median
+        cumulative = np.cumsum(hist)
+        lower = np.searchsorted(cumulative, (total - 1) // 2, side='right')
+        upper = np.searchsorted(cumulative, total // 2, side='right')
+        median = float((lower + upper) / 2)
 
-        perfect_gpu = cp.sum(coord_gpu == 12)
-        perfect_count = int(perfect_gpu.get())
-        total = coord_gpu.size
+        perfect_count = int(hist[12])
         perfect_ratio = perfect_count / total * 100
         defect_ratio = 100 - perfect_ratio
 
@@ -44,15 +54,18 @@ class CoordinationAnalyzer:
     
     def get_coord_evolution(self):
         timesteps = self.parser.get_timesteps()
-        mean_list = []
-        perfect_list = []
-        defect_list = []
-        for i in range(len(timesteps)):
-            stats = self.get_coord_stats(i)
-            mean_list.append(stats['mean'])
-            perfect_list.append(stats['perfect_ratio'])
-            defect_list.append(stats['defect_ratio'])
-        return timesteps, mean_list, perfect_list, defect_list
+        coord_np, offsets = self.parser.get_analysis_data_stacked('coord')
+        n_frames = offsets.shape[0] - 1
+        # One segmented bincount gives every frame's histogram without a
+        # per-atom frame id; the statistics follow on the host
+        n_values = max(int(coord_np.max()) + 1, 14) if coord_np.size else 14
+        hist = segment_bincount(coord_np, offsets, n_values)
+        totals = hist.sum(axis=1)
+        # Frames without atoms report NaN instead of a division warning
+        mean_coord = np.divide(hist @ np.arange(n_values), totals, out=np.full(n_frames, np.nan), where=totals > 0)
+        perfect_ratio = np.divide(hist[:, 12] * 100, totals, out=np.full(n_frames, np.nan), where=totals > 0)
+        defect_ratio = 100 - perfect_ratio
+        return timesteps, mean_coord.tolist(), perfect_ratio.tolist(), defect_ratio.tolist()
     
     def get_spatial_distribution(self, timestep_idx=-1):
         data = self.parser.get_data(timestep_idx)
@@ -62,30 +75,28 @@ class CoordinationAnalyzer:
     
     def classify_atoms(self, timestep_idx=-1):
         coord_np = self.get_coord_data(timestep_idx)
-        coord_gpu = cp.asarray(coord_np)
-        perfect_gpu = cp.where(coord_gpu == 12)[0]
-        surface_gpu = cp.where(coord_gpu < 9)[0]
-        detect_gpu = cp.where((coord_gpu >= 9) & (coord_gpu < 12))[0]
-        # Convert indices back to NumPy
-        perfect = cp.asnumpy(perfect_gpu)
-        surface = cp.asnumpy(surface_gpu)
-        detect = cp.asnumpy(detect_gpu)
+        xp = get_array_module(coord_np)
+        coord = xp.asarray(coord_np)
+        # Label every atom in one pass: 0 surface (< 9), 1 defect (9-11),
+        # 2 perfect (12), 3 excess (13+, not returned)
+        edges = xp.asarray([9, 12, 13], dtype=coord.dtype)
+        labels = cp.asnumpy(xp.searchsorted(edges, coord, side='right').astype(xp.int8))
+        perfect = np.flatnonzero(labels == 2)
+        surface = np.flatnonzero(labels == 0)
+        detect = np.flatnonzero(labels == 1)
         return perfect, surface, detect
     
     def get_coord_range_distribution(self, timestep_idx=-1):
-        coord_np = self.get_coord_data(timestep_idx)
-        coord_gpu = cp.asarray(coord_np)
-        total = coord_gpu.size
-
-        # Define masks on GPU
-        m1 = (coord_gpu >= 1) & (coord_gpu <= 4)
-        m2 = (coord_gpu >= 5) & (coord_gpu <= 8)
-        m3 = (coord_gpu >= 9) & (coord_gpu <= 11)
-        m4 = coord_gpu == 12
-        m5 = coord_gpu > 12
-
-        counts_gpu = cp.stack([cp.sum(m1), cp.sum(m2), cp.sum(m3), cp.sum(m4), cp.sum(m5)])
-        counts = cp.asnumpy(counts_gpu).tolist()
+        # One histogram pass, then sum the ranges on the host
+        all_counts = self.get_coord_histogram(timestep_idx)
+        total = all_counts.sum()
+        counts = [
+            int(all_counts[1:5].sum()),
+            int(all_counts[5:9].sum()),
+            int(all_counts[9:12].sum()),
+            int(all_counts[12]),
+            int(all_counts[13:].sum())
+        ]
         percentages = [(c / total) * 100 for c in counts]
 
         ranges = ['1-4', '5-8', '9-11', '12 (perfect)', '13+']
@@ -1,6 +1,9 @@
 from core.base_parser import BaseParser
+from utilities.array_module import get_array_module
+from utilities.analyzer import map_timesteps
 import numpy as np
 import cupy as cp
+import cupyx
 
 class DebrisAnalyzer:
     def __init__(self, parser: BaseParser):
@@ -8,77 +11,108 @@ class DebrisAnalyzer:
 
     def get_cluster_data(self, timestep_idx=-1):
         cluster_np = self.parser.get_analysis_data('cluster', timestep_idx)
-        cluster_gpu = cp.asarray(cluster_np, dtype=cp.int32)
-        unique_gpu = cp.unique(cluster_gpu)
-        unique = cp.asnumpy(unique_gpu)
+        xp = get_array_module(cluster_np)
+        cluster = xp.asarray(cluster_np)
+        # Group atoms by cluster id with one stable sort instead of a full
+        # scan per cluster; each cluster is then a contiguous run of the order
+        # (cupy's argsort is always stable, numpy's needs asking)
+        order = xp.argsort(cluster, kind='stable') if xp is np else xp.argsort(cluster)
+        sorted_ids = cp.asnumpy(cluster[order])
+        order = cp.asnumpy(order)
+        # First position of every id (the prepended value forces index 0)
+        starts = np.flatnonzero(np.diff(sorted_ids, prepend=sorted_ids[:1] - 1))
+        unique = sorted_ids[starts]
         cluster_sizes = {}
         cluster_atoms = {}
-        for cluster_id in unique:
+        for cluster_id, idx in zip(unique, np.split(order, starts[1:])):
             if cluster_id == 0: continue
-            idx_gpu = cp.where(cluster_gpu == cluster_id)[0]
-            idx = cp.asnumpy(idx_gpu)
             cluster_sizes[int(cluster_id)] = idx.size
             cluster_atoms[int(cluster_id)] = idx
         return unique, cluster_sizes, cluster_atoms
     
-    def get_cluster_evolution(self):
+    def get_cluster_sizes(self, timestep_idx=-1):
+        # Atom count per cluster id (index 0 is the unclustered id), without
+        # building the per-cluster index arrays of get_cluster_data
+        cluster_np = self.parser.get_analysis_data('cluster', timestep_idx)
+        xp = get_array_module(cluster_np)
+        return cp.asnumpy(xp.bincount(xp.asarray(cluster_np)))
+
+    def get_cluster_evolution(self, parallel=True):
         timesteps = self.parser.get_timesteps()
-        num_clusters = []
-        largest_cluster = []
-        average_cluster = []
 
-        for i in range(len(timesteps)):
-            _, sizes, _ = self.get_cluster_data(i)
-            values = list(sizes.values())
-            if values:
-                num_clusters.append(len(values))
-                largest_cluster.append(max(values))
-                average_cluster.append(float(np.mean(values)))
-            else:
-                num_clusters.append(0)
-                largest_cluster.append(0)
-                average_cluster.append(0.0)
+        def summarize(i):
+            sizes = self.get_cluster_sizes(i)[1:]
+            values = sizes[sizes > 0]
+            if values.size:
+                return int(values.size), int(values.max()), float(values.mean())
+            return 0, 0, 0.0
+
+        summaries = map_timesteps(summarize, len(timesteps), parallel)
+        num_clusters = [summary[0] for summary in summaries]
+        largest_cluster = [summary[1] for summary in summaries]
+        average_cluster = [summary[2] for summary in summaries]
 
         return timesteps, num_clusters, largest_cluster, average_cluster
 
     def get_cluster_size_distribution(self, timestep_idx=-1, min_size=2):
-        _, sizes, _ = self.get_cluster_data(timestep_idx)
-        filtered = [s for s in sizes.values() if s >= min_size]
-        if not filtered:
+        sizes = self.get_cluster_sizes(timestep_idx)[1:]
+        filtered = sizes[(sizes > 0) & (sizes >= min_size)]
+        if not filtered.size:
             return [], []
-        sizes_gpu = cp.asarray(filtered, dtype=cp.int32)
-        unique_gpu, counts_gpu = cp.unique(sizes_gpu, return_counts=True)
-        unique = cp.asnumpy(unique_gpu)
-        counts = cp.asnumpy(counts_gpu)
-        order = np.argsort(unique)
-        return unique[order].tolist(), counts[order].tolist()
+        unique, counts = np.unique(filtered, return_counts=True)
+        return unique.tolist(), counts.tolist()
     
     def get_cluster_spatial_data(self, timestep_idx=-1, min_size=2):
         data = self.parser.get_data(timestep_idx)
         x_np, y_np, z_np = self.parser.get_atoms_spatial_coordinates(data)
-        x_gpu, y_gpu, z_gpu = cp.asarray(x_np), cp.asarray(y_np), cp.asarray(z_np)
+        cluster_np = self.parser.get_analysis_data('cluster', timestep_idx)
+
+        # Scatter every atom into its cluster's row at once instead of
+        # gathering and averaging each cluster separately
+        cid_gpu = cp.asarray(cluster_np).astype(cp.int64)
+        coords_gpu = cp.stack([cp.asarray(x_np), cp.asarray(y_np), cp.asarray(z_np)], axis=1)
+        n_ids = int(cid_gpu.max()) + 1 if cid_gpu.size else 1
+        sums = cp.zeros((n_ids, 3))
+        counts = cp.zeros(n_ids, dtype=cp.int64)
+        cupyx.scatter_add(sums, cid_gpu, coords_gpu)
+        cupyx.scatter_add(counts, cid_gpu, 1)
 
-        _, sizes, atoms = self.get_cluster_data(timestep_idx)
-        positions = {}
+        keep = counts >= min_size
+        keep[0] = False
+        selected = cp.flatnonzero(keep)
+        centroids = cp.asnumpy(sums[selected] / counts[selected, None])
+        selected_sizes = cp.asnumpy(counts[selected])
+        selected = cp.asnumpy(selected)
 
-        for cid, size in sizes.items():
-            if size >= min_size:
-                idx = atoms[cid]
-                idx_gpu = cp.asarray(idx, dtype=cp.int32)
-                mean_x = float(cp.mean(x_gpu[idx_gpu]).get())
-                mean_y = float(cp.mean(y_gpu[idx_gpu]).get())
-                mean_z = float(cp.mean(z_gpu[idx_gpu]).get())
-                positions[cid] = (mean_x, mean_y, mean_z)
+        positions = {int(cid): tuple(float(v) for v in centroid) for cid, centroid in zip(selected, centroids)}
+        sizes = {int(cid): int(size) for cid, size in zip(selected, selected_sizes)}
 
         atom_coords = {
             'x': x_np,
             'y': y_np,
             'z': z_np,
-            'cluster_id': self.parser.get_analysis_data('cluster', timestep_idx)
+            'cluster_id': cluster_np
         }
-        return positions, {cid: sizes[cid] for cid in positions}, atom_coords
+        return positions, sizes, atom_coords
     
     def get_largest_clusters(self, timestep_idx: int = -1, n: int = 5):
-        _, sizes, _ = self.get_cluster_data(timestep_idx)
-        sorted_clusters = sorted(sizes.items(), key=lambda kv: kv[1], reverse=True)
-        return sorted_clusters[:n]
\ No newline at end of file
+        if n <= 0:
+            return []
+        sizes = self.get_cluster_sizes(timestep_idx)
+        if sizes.size == 0:
+            # Frame without atoms
+            return []
+        sizes[0] = 0
+        cluster_ids = np.flatnonzero(sizes)
+        values = sizes[cluster_ids]
+        # Partial selection of the n largest, then sort only those (largest
+        # first, ties in ascending id order). Ties at the cutoff keep the
+        # lowest ids, as a full stable sort would; cluster_ids is ascending.
+        if n < values.size:
+            cutoff = np.partition(values, -n)[-n]
+            top = values > cutoff
+            tied = np.flatnonzero(values == cutoff)
+            top[tied[:n - np.count_nonzero(top)]] = True
+            cluster_ids, values = cluster_ids[top], values[top]
+        order = np.lexsort((cluster_ids, -values))
+        return list(zip(cluster_ids[order].tolist(), values[order].tolist()))
\ No newline at end of file
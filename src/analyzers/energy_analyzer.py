@@ -1,96 +1,104 @@
 from core.base_parser import BaseParser
 from utilities.analyzer import get_data_from_coord_axis
+from utilities.kernels import moments, segment_moments
 import numpy as np
 import cupy as cp
 
+# Analysis type (see ANALYSIS_HEADERS) read for every energy type
+ENERGY_ANALYSIS_TYPES = {
+    # c_ke_mobile
+    'kinetic': 'ke_mobile',
+    # c_pe_mobile
+    'potential': 'pe_mobile',
+    # v_total_energy
+    'total': 'total_energy'
+}
+
 class EnergyAnalyzer:
     def __init__(self, parser: BaseParser):
         self.parser = parser
-        self._atom_groups = None
 
-    def get_energy_statistics(self, timestep_idx=-1, group=None, energy_type='total'):
-        # Retrieve raw energy values and move to GPU
+    def get_group_energy(self, timestep_idx=-1, group=None, energy_type='total'):
+        # Per-atom energy of a timestep, restricted to a group through the
+        # parser's per-timestep group cache (atom order changes between
+        # frames, so the mask cannot be reused across timesteps)
         energy_column = self.get_energy_column_by_type(energy_type)
         energy_cpu = self.parser.get_analysis_data(energy_column, timestep_idx)
-        energy_gpu = cp.asarray(energy_cpu, dtype=cp.float64)
         if group and group != 'all':
-            indices = self.parser.get_atom_group_indices(self.parser, timestep_idx)[group]
-            energy_gpu = energy_gpu[indices]
-        mean = float(cp.mean(energy_gpu).get())
-        median = float(cp.median(energy_gpu).get())
-        max = float(cp.max(energy_gpu).get())
-        min = float(cp.min(energy_gpu).get())
-        std = float(cp.std(energy_gpu).get())
-        sum = float(cp.sum(energy_gpu).get())
+            indices = self.parser.get_timestep_atom_groups(timestep_idx)[group]
+            energy_cpu = energy_cpu[indices]
+        return np.asarray(energy_cpu, dtype=np.float64)
+
+    def get_energy_statistics(self, timestep_idx=-1, group=None, energy_type='total'):
+        energy_cpu = self.get_group_energy(timestep_idx, group, energy_type)
+        # Sum, spread and extrema in one parallel pass on the host;
+        # the values are already here, so a device round trip would cost more
+        # than the reductions themselves. Only the median needs a partition.
+        total, std, minimum, maximum = moments(energy_cpu)
+        mean = total / energy_cpu.size
         return {
-            'mean': mean,
-            'median': median,
-            'max': max,
-            'min': min,
-            'std': std,
-            'sum': sum
+            'mean': float(mean),
+            'median': float(np.median(energy_cpu)),
+            'max': float(maximum),
+            'min': float(minimum),
+            'std': float(std),
+            'sum': float(total)
         }
 
     def get_energy_evolution(self, group=None, energy_type='total'):
         timesteps = self.parser.get_timesteps()
-        average_energy = []
-        max_energy = []
-        min_energy = []
-        sum_energy = []
-        for idx in range(len(timesteps)):
-            stats = self.get_energy_statistics(idx, group, energy_type)
-            average_energy.append(stats['mean'])
-            max_energy.append(stats['max'])
-            min_energy.append(stats['min'])
-            sum_energy.append(stats['sum'])
-        return timesteps, average_energy, max_energy, min_energy, sum_energy
+        energy_column = self.get_energy_column_by_type(energy_type)
+        # Every frame's (group-filtered) energies in one array, reduced per
+        # frame by a single parallel kernel call instead of a Python loop
+        energy_cpu, offsets = self.parser.get_analysis_data_stacked(energy_column, group)
+        energy_cpu = np.asarray(energy_cpu, dtype=np.float64)
+        totals, _, minimums, maximums = segment_moments(energy_cpu, offsets)
+        average_energy = totals / np.diff(offsets)
+        return timesteps, average_energy, maximums, minimums, totals
     
     def get_high_energy_regions(self, timestep_idx=-1, threshold_percentile=95, energy_type='total', group=None):
         # Fetch per-atom energy and optionally filter by group
         data = self.parser.get_data(timestep_idx)
         if group and group != 'all':
-            indices = self.parser.get_atom_group_indices(self.parser, timestep_idx)[group]
+            indices = self.parser.get_timestep_atom_groups(timestep_idx)[group]
             data = data[indices]
-        energy_column = self.get_energy_column_by_type(energy_type)
-        energy_cpu = data[:, energy_column]
-        energy_gpu = cp.asarray(energy_cpu, dtype=cp.float64)
+        energy_cpu = self.get_group_energy(timestep_idx, group, energy_type)
+        # A single order statistic selects the same atoms as comparing with
+        # the interpolated percentile, so an O(N) partition replaces the sort.
+        # The values and the mask both live on the host, so no device trip.
+        # (rank computed as np.percentile does: q / 100 * (n - 1))
+        last = energy_cpu.size - 1
         if energy_type == 'potential':
             # Most negative values = most stable
-            threshold = cp.percentile(energy_gpu, 100 - threshold_percentile)
-            mask_gpu = energy_gpu <= threshold
+            k = int(np.floor((100 - threshold_percentile) / 100 * last))
+            threshold = np.partition(energy_cpu, k)[k]
+            mask = energy_cpu <= threshold
         else:
-            threshold = cp.percentile(energy_gpu, threshold_percentile)
-            mask_gpu = energy_gpu >= threshold
+            k = int(np.ceil(threshold_percentile / 100 * last))
+            threshold = np.partition(energy_cpu, k)[k]
+            mask = energy_cpu >= threshold
         # Gather high-energy atoms
-        mask = cp.asnumpy(mask_gpu)
         high_energy_data = data[mask]
         return high_energy_data, mask
     
     def get_energy_column_by_type(self, energy_type):
-        types = {
-            # c_ke_mobile
-            'kinetic': 'ke_mobile',
-            # c_pe_mobile
-            'potential': 'pe_mobile',
-            # v_total_energy
-            'total': 'total_energy'
-        }
-        return types.get(energy_type, 'total_energy')
+        return ENERGY_ANALYSIS_TYPES.get(energy_type, 'total_energy')
 
     def calculate_energy_profile(self, timestep_idx=-1, axis='z', n_bins=20, energy_type='total'):
         data = self.parser.get_data(timestep_idx)
         coords_cpu = get_data_from_coord_axis(axis, self.parser.get_atoms_spatial_coordinates(data))
-        energy_column = self.get_energy_column_by_type(energy_type)
-        energy_cpu = data[:, energy_column]
+        energy_cpu = self.get_group_energy(timestep_idx, energy_type=energy_type)
         coords_gpu = cp.asarray(coords_cpu, dtype=cp.float64)
         energy_gpu = cp.asarray(energy_cpu, dtype=cp.float64)
         bin_edges_gpu = cp.linspace(coords_gpu.min(), coords_gpu.max(), n_bins + 1)
-        bin_centers_cpu = 0.5 * (cp.asnumpy(bin_edges_gpu[:-1]) + cp.asnumpy(bin_edges_gpu[1:]))
-        bin_indices = cp.digitize(coords_gpu, bin_edges_gpu)
-        profile_gpu = cp.zeros(n_bins, dtype=cp.float64)
-        for bin_id in range(1, n_bins + 1):
-            mask = bin_indices == bin_id
-            if cp.any(mask):
-                profile_gpu[bin_id - 1] = energy_gpu[mask].mean()
+        bin_edges_cpu = cp.asnumpy(bin_edges_gpu)
+        bin_centers_cpu = 0.5 * (bin_edges_cpu[:-1] + bin_edges_cpu[1:])
+        # Bin of every atom (the upper edge belongs to the last bin), then
+        # per-bin sums and counts in two bincounts instead of a mask per bin
+        bin_indices = cp.clip(cp.digitize(coords_gpu, bin_edges_gpu) - 1, 0, n_bins - 1)
+        sums_gpu = cp.bincount(bin_indices, weights=energy_gpu, minlength=n_bins)
+        counts_gpu = cp.bincount(bin_indices, minlength=n_bins)
+        # Empty bins report 0
+        profile_gpu = cp.where(counts_gpu > 0, sums_gpu / cp.maximum(counts_gpu, 1), 0.0)
         profile_cpu = cp.asnumpy(profile_gpu)
         return bin_centers_cpu.tolist(), profile_cpu.tolist()
\ No newline at end of file
@@ -1,10 +1,81 @@
 from core.base_parser import BaseParser
+from utilities.device_cache import DeviceCache
+from utilities.segments import segment_bincount, segment_moments
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 import numpy as np
 import cupy as cp
 
+# Equal-width bin of every value; the upper edge belongs to the last bin
+_bin_index_kernel = cp.ElementwiseKernel(
+    'float64 x, float64 low, float64 inverse_width, int32 n_bins',
+    'int32 b',
+    '''
+    b = (int)((x - low) * inverse_width);
+    if (b >= n_bins) b = n_bins - 1;
+    if (b < 0) b = 0;
+    ''',
+    'trybo_bin_index'
+)
+
+# Hotspot count, energy sum, energy maximum and hotspot energy sum in a
+# single pass: each thread reduces a grid-stride slice, warps combine their
+# partials with shuffles and one lane per warp merges into the output
+_hotspot_stats_kernel = cp.RawKernel(r'''
+__device__ void atomic_max_double(double* address, double value) {
+    unsigned long long* address_as_ull = (unsigned long long*) address;
+    unsigned long long old = *address_as_ull;
+    while (value > __longlong_as_double(old)) {
+        unsigned long long assumed = old;
+        old = atomicCAS(address_as_ull, assumed, __double_as_longlong(value));
+        if (old == assumed) break;
+    }
+}
+
+extern "C" __global__ void trybo_hotspot_stats(const double* ke, const bool* mask, long long n, double* out) {
+    double count = 0.0;
+    double total = 0.0;
+    double maximum = __longlong_as_double(0xfff0000000000000ULL);
+    double hotspot_total = 0.0;
+    long long stride = (long long) blockDim.x * gridDim.x;
+    for (long long i = (long long) blockIdx.x * blockDim.x + threadIdx.x; i < n; i += stride) {
+        double x = ke[i];
+        total += x;
+        maximum = fmax(maximum, x);
+        if (mask[i]) {
+            count += 1.0;
+            hotspot_total += x;
+        }
+    }
+    for (int offset = 16; offset > 0; offset /= 2) {
+        count += __shfl_down_sync(0xffffffff, count, offset);
+        total += __shfl_down_sync(0xffffffff, total, offset);
+        maximum = fmax(maximum, __shfl_down_sync(0xffffffff, maximum, offset));
+        hotspot_total += __shfl_down_sync(0xffffffff, hotspot_total, offset);
+    }
+    if ((threadIdx.x & 31) == 0) {
+        atomicAdd(&out[0], count);
+        atomicAdd(&out[1], total);
+        atomic_max_double(&out[2], maximum);
+        atomicAdd(&out[3], hotspot_total);
+    }
+}
+''', 'trybo_hotspot_stats')
+
+_HOTSPOT_STATS_THREADS = 256
+_HOTSPOT_STATS_MAX_BLOCKS = 1024
+
+@cp.fuse()
+def _masked_min(values, mask):
+    # Minimum over the masked values (inf when the mask is empty)
+    return cp.min(cp.where(mask, values, cp.inf))
+
 class HotspotAnalyzer:
     def __init__(self, parser: BaseParser):
         self.parser = parser
+        # Device copies of recently used frames, bounded by a memory budget
+        self._device_hotspot_data = DeviceCache()
 
     def get_hotspot_data(self, timestep_idx=-1):
         data = self.parser.get_data(timestep_idx)
@@ -12,17 +83,35 @@ class HotspotAnalyzer:
         ke_values = self.parser.get_analysis_data('ke_hotspots', timestep_idx)
         is_hotspot = self.parser.get_analysis_data('is_hotspot', timestep_idx)
         return x, y, z, ke_values, is_hotspot
+
+    def get_device_hotspot_data(self, timestep_idx=-1):
+        # Device copies of the kinetic energy and hotspot mask, uploaded once
+        # per timestep and reused by every statistic computed on that frame
+        if timestep_idx < 0:
+            timestep_idx += self.parser.num_timesteps
+        return self._device_hotspot_data.get(timestep_idx, lambda: self._upload_hotspot_data(timestep_idx))
+
+    def _upload_hotspot_data(self, timestep_idx):
+        ke_gpu = cp.asarray(self.parser.get_analysis_data('ke_hotspots', timestep_idx), dtype=cp.float64)
+        mask_gpu = cp.asarray(self.parser.get_analysis_data('is_hotspot', timestep_idx), dtype=cp.bool_)
+        return ke_gpu, mask_gpu
+
+    def clear_device_cache(self):
+        self._device_hotspot_data.clear()
     
     def get_hotspot_stats(self, timestep_idx=-1):
-        _, _, _, ke_np, mask_np = self.get_hotspot_data(timestep_idx)
-        ke_gpu = cp.asarray(ke_np, dtype=cp.float64)
-        mask_gpu = cp.asarray(mask_np, dtype=cp.bool_)
+        ke_gpu, mask_gpu = self.get_device_hotspot_data(timestep_idx)
         total = ke_gpu.size
-        hotspot_cnt = int(cp.sum(mask_gpu).get())
+        # All four reductions in one kernel launch and one transfer
+        results_gpu = cp.array([0.0, 0.0, -np.inf, 0.0])
+        blocks = max(1, min(_HOTSPOT_STATS_MAX_BLOCKS, -(-total // _HOTSPOT_STATS_THREADS)))
+        _hotspot_stats_kernel((blocks,), (_HOTSPOT_STATS_THREADS,), (ke_gpu, mask_gpu, cp.int64(total), results_gpu))
+        results = results_gpu.get()
+        hotspot_cnt = int(results[0])
         hotspot_pct = hotspot_cnt / total * 100 if total else 0.8
-        average_energy = float(cp.mean(ke_gpu).get())
-        max_energy = float(cp.max(ke_gpu).get())
-        hotspot_average = float(cp.mean(ke_gpu[mask_gpu]).get()) if hotspot_cnt else 0.0
+        average_energy = float(results[1] / total)
+        max_energy = float(results[2])
+        hotspot_average = float(results[3] / hotspot_cnt) if hotspot_cnt else 0.0
         return {
             'total_atoms': total,
             'hotspot_count': hotspot_cnt,
@@ -33,68 +122,61 @@ class HotspotAnalyzer:
         }
     
     def get_energy_distribution(self, timestep_idx=-1, bins=50):
-        _, _, _, ke_np, mask_np = self.get_hotspot_data(timestep_idx)
-        ke_gpu = cp.asarray(ke_np, dtype=cp.float64)
-        histogram_gpu, bin_edges_gpu = cp.histogram(ke_gpu, bins=bins)
-        histogram = cp.asnumpy(histogram_gpu)
-        bin_edges = cp.asnumpy(bin_edges_gpu)
-        norm_pct = histogram / histogram.sum() * 100 if histogram.sum() else histogram
-        # threshold used in LAMMPS, minimum hotspot energy
-        mask_gpu = cp.asarray(mask_np, dtype=cp.bool_)
-        if cp.any(mask_gpu):
-            threshold = float(cp.min(ke_gpu[mask_gpu]).get())
-        else:
-            threshold = None
+        ke_gpu, mask_gpu = self.get_device_hotspot_data(timestep_idx)
+        # Range of the histogram and the minimum hotspot energy (threshold
+        # used in LAMMPS) come back together in one transfer
+        low, high, threshold = cp.stack([ke_gpu.min(), ke_gpu.max(), _masked_min(ke_gpu, mask_gpu)]).get()
+        if low == high:
+            # Same fallback range as np.histogram for constant input
+            low, high = low - 0.5, high + 0.5
+        bin_edges = np.linspace(low, high, bins + 1)
+        # Bin every atom in one elementwise pass and count the bins
+        bin_indices = _bin_index_kernel(ke_gpu, low, bins / (high - low), bins)
+        histogram = cp.asnumpy(cp.bincount(bin_indices, minlength=bins))
+        # Every atom lands in a bin, so the atom count is the histogram total
+        norm_pct = histogram / ke_gpu.size * 100 if ke_gpu.size else histogram
+        threshold = float(threshold) if np.isfinite(threshold) else None
         return bin_edges, histogram, norm_pct, threshold
 
     def get_hotspot_evolution(self):
         timesteps = self.parser.get_timesteps()
-        hotspot_counts = []
-        hotspot_ratios = []
-        average_eneries = []
-        max_energies = []
-        for i in range(len(timesteps)):
-            stats = self.get_hotspot_stats(i)
-            hotspot_counts.append(stats['hotspot_count'])
-            hotspot_ratios.append(stats['hotspot_ratio'])
-            average_eneries.append(stats['average_energy'])
-            max_energies.append(stats['max_energy'])
-        return timesteps, hotspot_counts, hotspot_ratios, average_eneries, max_energies
+        ke_np, offsets = self.parser.get_analysis_data_stacked('ke_hotspots')
+        mask_np, _ = self.parser.get_analysis_data_stacked('is_hotspot')
+        n_frames = offsets.shape[0] - 1
+        # Segmented reductions read each frame's bounds from the offsets, so
+        # no frame id is built per atom; get_array_module picks the backend
+        energy_totals, _, _, maximums = segment_moments(ke_np, offsets)
+        hotspot_counts = segment_bincount(mask_np, offsets, 2)[:, 1]
+        totals = np.diff(offsets)
+        hotspot_ratios = np.divide(hotspot_counts * 100, totals, out=np.zeros(n_frames), where=totals > 0)
+        average_eneries = np.divide(energy_totals, totals, out=np.zeros(n_frames), where=totals > 0)
+        return timesteps, hotspot_counts.tolist(), hotspot_ratios.tolist(), average_eneries.tolist(), maximums.tolist()
         
     def get_hotspot_clusters(self, timestep_idx=-1, cutoff=3.0):
         x, y, z, _, is_hotspot = self.get_hotspot_data(timestep_idx)
         hotspot_atoms_indices = np.where(is_hotspot > 0)[0]
         if len(hotspot_atoms_indices) == 0:
             return {}, {}, {}
-        hotspot_atoms_x = x[hotspot_atoms_indices]
-        hotspot_atoms_y = y[hotspot_atoms_indices]
-        hotspot_atoms_z = z[hotspot_atoms_indices]
-        clusters = {}
-        cluster_id = 0
-        unassigned = set(range(len(hotspot_atoms_indices)))
-        while unassigned:
-            current_cluster = []
-            seed = next(iter(unassigned))
-            queue = [seed]
-            unassigned.remove(seed)
-            while queue:
-                current = queue.pop(0)
-                current_cluster.append(current)
-                # Find neighbors
-                for i in list(unassigned):
-                    dx = hotspot_atoms_x[current] - hotspot_atoms_x[i]
-                    dy = hotspot_atoms_y[current] - hotspot_atoms_y[i]
-                    dz = hotspot_atoms_z[current] - hotspot_atoms_z[i]
-                    distance = np.sqrt(dx * dx + dy * dy + dz * dz)
-                    if distance <= cutoff:
-                        queue.append(i)
-                        unassigned.remove(i)
-            clusters[cluster_id] = hotspot_atoms_indices[np.array(current_cluster)]
-            cluster_id += 1
-        cluster_sizes = { cluster_id: len(indices) for cluster_id, indices in clusters.items() }
-        cluster_positions = {}
-        for cluster_id, indices in clusters.items():
-            cluster_positions[cluster_id] = (np.mean(x[indices]), np.mean(y[indices]), np.mean(z[indices]))
+        points = np.column_stack((x[hotspot_atoms_indices], y[hotspot_atoms_indices], z[hotspot_atoms_indices]))
+        n_hotspots = points.shape[0]
+        # Neighbor pairs from a k-d tree, then connected components of the
+        # resulting graph label every cluster at once
+        pairs = cKDTree(points).query_pairs(r=cutoff, output_type='ndarray')
+        graph = coo_matrix(
+            (np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])),
+            shape=(n_hotspots, n_hotspots)
+        )
+        n_clusters, labels = connected_components(graph, directed=False)
+        sizes = np.bincount(labels, minlength=n_clusters)
+        centroids = np.column_stack([
+            np.bincount(labels, weights=points[:, axis], minlength=n_clusters) / sizes
+            for axis in range(3)
+        ])
+        order = np.argsort(labels, kind='stable')
+        members = np.split(hotspot_atoms_indices[order], np.cumsum(sizes)[:-1])
+        clusters = dict(enumerate(members))
+        cluster_sizes = { cluster_id: int(size) for cluster_id, size in enumerate(sizes) }
+        cluster_positions = { cluster_id: tuple(centroid) for cluster_id, centroid in enumerate(centroids) }
         return clusters, cluster_sizes, cluster_positions
 
     def get_spatial_energy_distribution(self, timestep_idx=-1):
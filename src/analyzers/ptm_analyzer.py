@@ -1,10 +1,42 @@
 from core.base_parser import BaseParser
+from utilities.array_module import get_array_module
+from utilities.device_cache import DeviceCache
+from utilities.kernels import moments, segment_medians
+from utilities.segments import segment_bincount, segment_moments
 import numpy as np
 import cupy as cp
 
+# Number of PTM structure types counted by the histogram kernel (0-5)
+N_STRUCTURE_TYPES = 6
+
+# Fixed-size histogram of the structure types: each block counts into shared
+# memory and merges its six counters into the output once. Types outside the
+# named ones are ignored, as in the reported distribution.
+_structure_count_kernel = cp.RawKernel(r'''
+extern "C" __global__ void trybo_structure_count(const unsigned char* types, long long n, unsigned long long* out) {
+    __shared__ unsigned int counts[6];
+    if (threadIdx.x < 6) counts[threadIdx.x] = 0;
+    __syncthreads();
+    long long stride = (long long) blockDim.x * gridDim.x;
+    for (long long i = (long long) blockIdx.x * blockDim.x + threadIdx.x; i < n; i += stride) {
+        unsigned char type = types[i];
+        if (type < 6) atomicAdd(&counts[type], 1u);
+    }
+    __syncthreads();
+    if (threadIdx.x < 6) atomicAdd(&out[threadIdx.x], (unsigned long long) counts[threadIdx.x]);
+}
+''', 'trybo_structure_count')
+
+_STRUCTURE_COUNT_THREADS = 256
+_STRUCTURE_COUNT_MAX_BLOCKS = 128
+
 class PTMAnalyzer:
     def __init__(self, parser: BaseParser):
         self.parser = parser
+        # Device copies of single frames, bounded by a memory budget
+        self._device_structure_types = DeviceCache()
+        # (T, K) structure counts per frame, keyed by group
+        self._structure_counts = {}
 
         self.structure_names = {
             0: 'Other',
@@ -29,63 +61,124 @@ class PTMAnalyzer:
             # SC
             5: 'orange'
         }
-
-        self._atoms_groups = None
     
-    def get_structure_distribution(self, timestep_idx=-1, group=None):
-        # Load the per-atom PTM type and optionally filter by atom group
-        ptm_columns = self.parser.get_analysis_data('ptm', timestep_idx)
-        ptm_types_cpu = ptm_columns[0].astype(int)
-        ptm_types_gpu = cp.asarray(ptm_types_cpu, dtype=cp.int32)
+    def get_device_structure_types(self, timestep_idx=-1, group=None):
+        # c_ptm[1] of one frame (optionally filtered by group) on the device,
+        # kept in the analyzer's cache for later queries of the same frame
+        if timestep_idx < 0:
+            timestep_idx += self.parser.num_timesteps
+        if group == 'all':
+            group = None
+        return self._device_structure_types.get(
+            (timestep_idx, group),
+            lambda: cp.asarray(self._get_structure_types(timestep_idx, group))
+        )
+
+    def _get_structure_types(self, timestep_idx, group):
+        ptm_types = self.parser.get_analysis_data('ptm', timestep_idx)[0]
         if group and group != 'all':
-            positions = self.parser.get_data(timestep_index)
-            group_indices = self.parser.get_atom_group_indices(positions)[group]
-            ptm_types_gpu = ptm_types_gpu[group_indices]
+            ptm_types = ptm_types[self.parser.get_timestep_atom_groups(timestep_idx)[group]]
+        # PTM types are small integers; uint8 keeps the device copy compact
+        return ptm_types.astype(np.uint8)
 
-        # Count each structure type on GPU
-        max_type = max(self.structure_labels.keys())
-        counts_gpu = cp.bincount(ptm_types_gpu, minlength=max_type + 1)
-        counts_cpu = cp.asnumpy(counts_gpu)
+    def clear_device_cache(self):
+        self._device_structure_types.clear()
+        self._structure_counts.clear()
+
+    def get_structure_distribution(self, timestep_idx=-1, group=None):
+        # Only the requested frame is read; small frames are counted on the
+        # host, large ones with the six-bin histogram kernel
+        if timestep_idx < 0:
+            timestep_idx += self.parser.num_timesteps
+        ptm_types = self._get_structure_types(timestep_idx, group)
+        if get_array_module(ptm_types) is np:
+            counts_cpu = np.bincount(ptm_types, minlength=N_STRUCTURE_TYPES)[:N_STRUCTURE_TYPES]
+        else:
+            key = (timestep_idx, None if group == 'all' else group)
+            ptm_types_gpu = self._device_structure_types.get(key, lambda: cp.asarray(ptm_types))
+            n = ptm_types_gpu.size
+            counts_gpu = cp.zeros(N_STRUCTURE_TYPES, dtype=cp.uint64)
+            blocks = max(1, min(_STRUCTURE_COUNT_MAX_BLOCKS, -(-n // _STRUCTURE_COUNT_THREADS)))
+            _structure_count_kernel((blocks,), (_STRUCTURE_COUNT_THREADS,), (ptm_types_gpu, cp.int64(n), counts_gpu))
+            counts_cpu = cp.asnumpy(counts_gpu)
 
         # Map to labels
         distribution = {
-            self.structure_labels[stype]: int(counts_cpu[stype])
-            for stype in self.structure_labels
+            self.structure_names[stype]: int(counts_cpu[stype])
+            for stype in self.structure_names
         }
         return distribution
     
     def get_rmsd_statistics(self, timestep_idx=-1, group=None):
         ptm_columns = self.parser.get_analysis_data('ptm', timestep_idx)
         rmsd_cpu = ptm_columns[1]
-        rmsd_gpu = cp.asarray(rmsd_cpu, dtype=cp.float64)
         if group and group != 'all':
-            positions = self.parser.get_data(timestep_idx)
-            group_indices = self.parser.get_atom_group_indices(positions)[group]
-            rmsd_gpu = rmsd_gpu[group_indices]
-        valid_mask = cp.isfinite(rmsd_gpu)
-        valid_rmsd_gpu = rmsd_gpu[valid_mask]
-        if valid_rmsd_gpu.size > 0:
-            mean = float(cp.mean(valid_rmsd_gpu).get())
-            median = float(cp.median(valid_rmsd_gpu).get())
-            max = float(cp.max(valid_rmsd_gpu).get())
-            min = float(cp.min(valid_rmsd_gpu).get())
-            std = float(cp.std(valid_rmsd_gpu).get())
+            group_indices = self.parser.get_timestep_atom_groups(timestep_idx)[group]
+            rmsd_cpu = rmsd_cpu[group_indices]
+        # Non-finite RMSD marks atoms PTM could not match. The compacted values
+        # are needed for the median anyway; the sum, spread and extrema then
+        # come from one parallel pass on the host (no device round trip)
+        valid_rmsd = np.asarray(rmsd_cpu[np.isfinite(rmsd_cpu)], dtype=np.float64)
+        if valid_rmsd.size > 0:
+            total, std, minimum, maximum = moments(valid_rmsd)
+            mean = total / valid_rmsd.size
+            median = float(np.median(valid_rmsd))
         else:
-            mean = median = max = min = std = float('nan')
+            mean = median = maximum = minimum = std = float('nan')
 
         return {
-            'mean_rmsd': mean,
+            'mean_rmsd': float(mean),
             'median_rmsd': median,
-            'max_rmsd': max,
-            'min_rmsd': min,
-            'std_rmsd': std
+            'max_rmsd': float(maximum),
+            'min_rmsd': float(minimum),
+            'std_rmsd': float(std)
         }
     
+    def get_rmsd_evolution(self, group=None):
+        timesteps = self.parser.get_timesteps()
+        # c_ptm[2] of every frame. Non-finite values (atoms PTM could not
+        # match) are dropped first; the offsets of the compacted frames come
+        # from a running count of the kept values, so no frame id is built
+        rmsd_cpu, offsets = self.parser.get_analysis_data_stacked('ptm', group, column=1)
+        valid = np.isfinite(rmsd_cpu)
+        valid_offsets = np.concatenate(([0], np.cumsum(valid)))[offsets]
+        # Single precision halves the transfer when the moments run on the
+        # device; they are still accumulated in float64
+        valid_rmsd = rmsd_cpu[valid].astype(np.float32)
+        sums, stds, minimums, maximums = segment_moments(valid_rmsd, valid_offsets)
+        # Medians need every frame's values in order, so they stay on the host
+        medians = segment_medians(valid_rmsd, valid_offsets)
+        # Frames without finite values report NaN, as get_rmsd_statistics does
+        counts = np.diff(valid_offsets)
+        means = np.divide(sums, counts, out=np.full(counts.shape[0], np.nan), where=counts > 0)
+        minimums[counts == 0] = np.nan
+        maximums[counts == 0] = np.nan
+        return timesteps, {
+            'mean_rmsd': means,
+            'median_rmsd': medians,
+            'max_rmsd': maximums,
+            'min_rmsd': minimums,
+            'std_rmsd': stds
+        }
+
     def get_structure_evolution(self, group=None):
         timesteps = self.parser.get_timesteps()
-        evolution = { name: [] for name in self.structure_names.values() }
-        for idx in range(len(timesteps)):
-            counts = self.get_structure_distribution(idx, group)
-            for name, count in counts.items():
-                evolution[name].append(count)
-        return timesteps, evolution
\ No newline at end of file
+        if group == 'all':
+            group = None
+        counts = self._load_structure_counts(group)
+        evolution = { name: counts[:, stype].tolist() for stype, name in self.structure_names.items() }
+        return timesteps, evolution
+
+    def _load_structure_counts(self, group):
+        # Memoized per group on the instance so repeated evolutions (e.g.
+        # one plot per group) skip the work. One segmented bincount counts
+        # every frame; types beyond the named ones are not counted, so they
+        # cannot spill into the next frame
+        if group in self._structure_counts:
+            return self._structure_counts[group]
+        ptm_types, offsets = self.parser.get_analysis_data_stacked('ptm', group, column=0)
+        counts = segment_bincount(ptm_types, offsets, max(self.structure_names) + 1)
+        # Shared by every later call, so it must not be modified in place
+        counts.setflags(write=False)
+        self._structure_counts[group] = counts
+        return counts
@@ -1,12 +1,12 @@
 from core.base_parser import BaseParser
 from utilities.analyzer import get_data_from_coord_axis
+from utilities.kernels import binned_profile, min_max, moments, segment_moments
 import numpy as np
 import cupy as cp
 
 class VelocitySquaredAnalyzer:
     def __init__(self, parser: BaseParser):
         self.parser = parser
-        self._atom_groups = None
         # Conversion factor for metal units
         self.metal_units_conversion = 25.464
 
@@ -18,60 +18,67 @@ class VelocitySquaredAnalyzer:
         velocity_squared = self.parser.get_analysis_data('velocity_squared', timestep_idx)
         data = self.parser.get_data(timestep_idx)
         if group is not None and group != 'all':
-            group_indices = self.parser.get_atom_group_indices(data)[group]
+            group_indices = self.parser.get_timestep_atom_groups(timestep_idx)[group]
             velocity_squared = velocity_squared[group_indices]
             data = data[group_indices]
-        hot_threshold = np.percentile(velocity_squared, threshold_percentile)
+        # Atoms at or above the interpolated percentile are those at or above
+        # the order statistic at ceil(rank) (up to rounding of the rank), so a
+        # single O(N) partition selects them (rank = q / 100 * (n - 1))
+        k = int(np.ceil(threshold_percentile / 100 * (velocity_squared.size - 1)))
+        hot_threshold = np.partition(velocity_squared, k)[k]
         hot_spots_mask = velocity_squared >= hot_threshold
         hot_spots_data = data[hot_spots_mask]
         return hot_spots_data, hot_spots_mask
     
     def get_temperature_evolution(self, group=None):
         timesteps = self.parser.get_timesteps()
-        average_temperature = []
-        max_temperature = []
-        min_temperature = []
-        for idx in range(len(timesteps)):
-            velocity_squared = self.parser.get_analysis_data('velocity_squared', idx)
-            if group is not None and group != 'all':
-                data = self.parser.get_data(idx)
-                group_indices = self.parser.get_atom_group_indices(data)[group]
-                velocity_squared = velocity_squared[group_indices]
-            temperature = self.velocity_to_temperature(velocity_squared)
-            average_temperature.append(np.mean(temperature))
-            max_temperature.append(np.max(temperature))
-            min_temperature.append(np.min(temperature))
+        velocity_squared, offsets = self.parser.get_analysis_data_stacked('velocity_squared', group)
+        # Statistics of v² per frame in one kernel call; the temperature is a
+        # positive multiple of v², so the scale is applied to the results
+        # instead of materializing a temperature array
+        velocity_squared = np.asarray(velocity_squared, dtype=np.float64)
+        totals, _, minimums, maximums = segment_moments(velocity_squared, offsets)
+        average_temperature = self.velocity_to_temperature(totals / np.diff(offsets))
+        max_temperature = self.velocity_to_temperature(maximums)
+        min_temperature = self.velocity_to_temperature(minimums)
         return timesteps, average_temperature, max_temperature, min_temperature
 
     def get_temperature_statistics(self, timestep_idx=-1, group=None):
         velocity_squared = self.parser.get_analysis_data('velocity_squared', timestep_idx)
-        data = self.parser.get_data(timestep_idx)
         if group is not None and group != 'all':
-            group_indices = self.parser.get_atom_group_indices(data)[group]
+            group_indices = self.parser.get_timestep_atom_groups(timestep_idx)[group]
             velocity_squared = velocity_squared[group_indices]
-        temperature = self.velocity_to_temperature(velocity_squared)
+        velocity_squared = np.asarray(velocity_squared, dtype=np.float64)
+        # One pass for the moments and extrema of v², scaled afterwards
+        total, std, minimum, maximum = moments(velocity_squared)
+        mean = total / velocity_squared.size
         stats = {
-            'mean': np.mean(temperature),
-            'median': np.median(temperature),
-            'max': np.max(temperature),
-            'min': np.min(temperature),
-            'std': np.std(temperature)
+            'mean': self.velocity_to_temperature(mean),
+            'median': self.velocity_to_temperature(np.median(velocity_squared)),
+            'max': self.velocity_to_temperature(maximum),
+            'min': self.velocity_to_temperature(minimum),
+            'std': self.velocity_to_temperature(std)
         }
         
         return stats
 
     def calculate_temperature_gradient(self, timestep_idx=-1, axis='z', n_bins=20):
-        timesteps = self.parser.get_timesteps()
         data = self.parser.get_data(timestep_idx)
         atoms_spatial_coordinates = self.parser.get_atoms_spatial_coordinates(data)
         coords = get_data_from_coord_axis(axis, atoms_spatial_coordinates)
         
         velocity_squared = self.parser.get_analysis_data('velocity_squared', timestep_idx)
+        velocity_squared = np.asarray(velocity_squared, dtype=np.float64)
         
-        temperature = self.velocity_to_temperature(velocity_squared)
-        bins = np.linspace(np.min(coords), np.max(coords), n_bins + 1)
+        low, high = min_max(coords)
+        bins = np.linspace(low, high, n_bins + 1)
         bin_centers = 0.5 * (bins[1:] + bins[:-1])
-        digitized = np.digitize(coords, bins)
-        bin_temps = [temperature[digitized == i].mean() for i in range(1, len(bins))]
+        # Per-bin counts and v² sums in a single parallel pass (same bins as
+        # np.histogram); the bin means are scaled to temperatures afterwards,
+        # so no temperature array is built. Empty bins stay NaN.
+        sums, counts, _ = binned_profile(coords, velocity_squared, low, high, n_bins, np.inf)
+        bin_temps = self.velocity_to_temperature(
+            np.divide(sums, counts, out=np.full(n_bins, np.nan), where=counts > 0)
+        )
         
         return bin_centers, bin_temps
\ No newline at end of file
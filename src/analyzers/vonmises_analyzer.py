@@ -1,58 +1,102 @@
 from core.base_parser import BaseParser
+from core.cache import get_cache_path, load_cached_arrays, save_cached_arrays
+from utilities.kernels import segment_moments
 import numpy as np
 
+# Groups that split every frame, in the order of the parser's group permutation
+FRAME_GROUPS = ('lower_plane', 'nanoparticle', 'upper_plane')
+
+# The evolutions are only plotted; reductions accumulate in float64 and the
+# cached results are stored in single precision
+STRESS_DTYPE = np.float32
+
+# Names of the (average, max, min) arrays of a group in the disk cache
+STRESS_FIELDS = ('average', 'max', 'min')
+
 class VonMisesAnalyzer:
     def __init__(self, parser: BaseParser):
         self.parser = parser
-        self.group_indices = None
 
-        self._average_stress_cache = None
-        self._max_stress_cache = None
-        self._min_stress_cache = None
+        # (average, max, min) per group, filled by _load_all_groups
+        self._group_stress_cache = {}
 
     def get_stress_evolution(self):
-        if self._average_stress_cache is not None:
-            return self._average_stress_cache, self._max_stress_cache, self._min_stress_cache
-        
-        timesteps = self.parser.get_timesteps()
-        average_stress = []
-        max_stress = []
-        min_stress = []
-
-        for i in range(len(timesteps)):
-            stress = self.parser.get_analysis_data('vonmises', i)
-            average_stress.append(np.mean(stress))
-            max_stress.append(np.max(stress))
-            min_stress.append(np.min(stress))
-        
-        self._average_stress_cache = np.array(average_stress)
-        self._max_stress_cache = np.array(max_stress)
-        self._min_stress_cache = np.array(min_stress)
-
-        return self._average_stress_cache, self._max_stress_cache, self._min_stress_cache
-    
+        return self.get_stress_evolution_by_group('all')
+
     def get_stress_evolution_by_group(self, group='all'):
         '''
         Args:
             group: ('lower_plane', 'upper_plane', 'nanoparticle', 'all')
         '''
-        timesteps = self.parser.get_timesteps()
-        average_stress = []
-        max_stress = []
-        min_stress = []
-        
-        for i in range(len(timesteps)):
-            # Obtener datos del grupo para este timestep
-            data = self.parser.get_data(i)
-            group_indices = self.parser.get_atom_group_indices(data)[group]
-            
-            # Usar get_analysis_data para obtener valores de estrés von Mises
-            stress = self.parser.get_analysis_data('vonmises', i)
-            # Aplicar filtro de grupo
-            stress = stress[group_indices]
-            
-            average_stress.append(np.mean(stress))
-            max_stress.append(np.max(stress))
-            min_stress.append(np.min(stress))
-        
-        return np.array(average_stress), np.array(max_stress), np.array(min_stress)
\ No newline at end of file
+        if not self._group_stress_cache:
+            self._load_all_groups()
+        if group not in self._group_stress_cache:
+            self._group_stress_cache[group] = self._compute_group(group)
+        return self._group_stress_cache[group]
+
+    def _load_all_groups(self):
+        # With the disk cache enabled, every group's evolution is stored once
+        # per trajectory, so later runs on the same file skip the frame pass
+        cache_path = get_cache_path(self.parser.filename, 'vonmises-stress')
+        cached = load_cached_arrays(cache_path)
+        names = [f'{group}_{field}' for group in FRAME_GROUPS + ('all',) for field in STRESS_FIELDS]
+        if cached is not None and all(name in cached for name in names):
+            for group in FRAME_GROUPS + ('all',):
+                self._group_stress_cache[group] = tuple(cached[f'{group}_{field}'] for field in STRESS_FIELDS)
+            return
+        self._compute_all_groups()
+        save_cached_arrays(cache_path, {
+            f'{group}_{field}': values
+            for group in FRAME_GROUPS + ('all',)
+            for field, values in zip(STRESS_FIELDS, self._group_stress_cache[group])
+        })
+
+    def _compute_all_groups(self):
+        # Each frame is gathered by the parser's group permutation, which
+        # makes lower plane, nanoparticle and upper plane consecutive ranges,
+        # so one pass over the stacked frames reduces every group at once:
+        # each frame is cut into three segments
+        stress, offsets = self.parser.get_analysis_data_stacked('vonmises')
+        n_frames = offsets.shape[0] - 1
+        grouped_stress = np.empty(stress.shape[0], dtype=np.float64)
+        group_offsets = np.empty(3 * n_frames + 1, dtype=np.int64)
+        group_offsets[-1] = offsets[-1]
+        for i in range(n_frames):
+            order, lower_end, upper_start = self.parser.get_timestep_group_order(i)
+            if upper_start < lower_end:
+                # Overlapping planes (very thin sample) do not split the frame
+                for group in FRAME_GROUPS + ('all',):
+                    self._group_stress_cache[group] = self._compute_group(group)
+                return
+            frame_stress = stress[offsets[i]:offsets[i + 1]]
+            np.take(frame_stress, order, out=grouped_stress[offsets[i]:offsets[i + 1]])
+            group_offsets[3 * i:3 * i + 3] = offsets[i], offsets[i] + lower_end, offsets[i] + upper_start
+        stress = grouped_stress
+        totals, _, minimums, maximums = segment_moments(stress, group_offsets)
+        counts = np.diff(group_offsets)
+        totals, minimums, maximums, counts = (values.reshape(n_frames, 3) for values in (totals, minimums, maximums, counts))
+        for column, group in enumerate(FRAME_GROUPS):
+            self._group_stress_cache[group] = self._as_stress_arrays(
+                np.divide(totals[:, column], counts[:, column], out=np.full(n_frames, np.nan), where=counts[:, column] > 0),
+                maximums[:, column],
+                minimums[:, column]
+            )
+        # The whole frame combines its three segments
+        self._group_stress_cache['all'] = self._as_stress_arrays(
+            totals.sum(axis=1) / counts.sum(axis=1),
+            maximums.max(axis=1),
+            minimums.min(axis=1)
+        )
+
+    def _compute_group(self, group):
+        # Group rows of every frame stacked, then reduced with frames spread
+        # over threads (prange) in a single kernel call
+        stress, offsets = self.parser.get_analysis_data_stacked('vonmises', group)
+        stress = np.asarray(stress, dtype=np.float64)
+        totals, _, minimums, maximums = segment_moments(stress, offsets)
+        counts = np.diff(offsets)
+        average_stress = np.divide(totals, counts, out=np.full(counts.shape[0], np.nan), where=counts > 0)
+        return self._as_stress_arrays(average_stress, maximums, minimums)
+
+    def _as_stress_arrays(self, average_stress, max_stress, min_stress):
+        return tuple(values.astype(STRESS_DTYPE, copy=False) for values in (average_stress, max_stress, min_stress))
@@ -8,6 +8,21 @@ import logging
 import sys
 import gc
 
+# Parser of the current worker process, opened once by _init_worker and
+# shared by every analysis the worker runs
+_WORKER_PARSER = None
+
+def _init_worker(analysis_file_path):
+    global _WORKER_PARSER
+    _WORKER_PARSER = BaseParser(analysis_file_path)
+
+def _run_worker_analysis(function, timestep, output_folder, memory_efficient):
+    try:
+        return function(_WORKER_PARSER, timestep, output_folder)
+    finally:
+        if memory_efficient:
+            _WORKER_PARSER.clear_data_cache()
+
 class Analyzer:
     def __init__(self, yaml_config=None, dump_folder=None):
         self.logger = logging.getLogger('Analyzer')
@@ -28,6 +43,13 @@ class Analyzer:
         self.parallel_execution = False
         self.max_workers = os.cpu_count() or 1
 
+    def __getstate__(self):
+        # Analysis methods are sent to the workers as bound methods; the
+        # workers have their own parser, so this one is not pickled
+        state = self.__dict__.copy()
+        state['parser'] = None
+        return state
+
     def _create_parser(self):
         analysis_file_path = os.path.join(self.dump_folder, 'analysis.lammpstrj')
         if not os.path.isfile(analysis_file_path):
@@ -108,35 +130,29 @@ class Analyzer:
             if not output_folder:
                 return False
         
-        # Change to output directory for saving visualizations
-        original_dir = os.getcwd()
-        os.chdir(output_folder)
-        
         # Determine which analyses to run
         analyses_to_run = self._get_analyses_to_run(analysis_type)
         if not analyses_to_run:
-            os.chdir(original_dir)
             return False
 
         success = True
         if self.parallel_execution and len(analyses_to_run) > 1:
-            success = self.run_analysis_parallel(analyses_to_run, timestep)
+            success = self.run_analysis_parallel(analyses_to_run, timestep, output_folder)
         else:
-            success = self._run_analyses_sequential(analyses_to_run, timestep)
+            success = self._run_analyses_sequential(analyses_to_run, timestep, output_folder)
 
-        os.chdir(original_dir)
         elapsed_time = time.time() - start_time
         self.logger.info(f'Analysis completed in {elapsed_time:.2f} seconds')
         self.logger.info(f'Analysis results saved to {output_folder}')
         
         return success
 
-    def _run_analyses_sequential(self, analyses_to_run, timestep):
+    def _run_analyses_sequential(self, analyses_to_run, timestep, output_folder):
         success = True
         for name, function in analyses_to_run:
             try:
                 self.logger.info(f'Starting "{name}" analysis...')
-                result = function(timestep)
+                result = function(self.parser, timestep, output_folder)
                 if result:
                     self.logger.info(f'Completed "{name}" analysis')
                 else:
@@ -150,45 +166,50 @@ class Analyzer:
                 success = False
         return success
 
-    def run_analysis_parallel(self, analyses_to_run, timestep):
+    def run_analysis_parallel(self, analyses_to_run, timestep, output_folder):
         success = True
         max_workers = min(len(analyses_to_run), self.max_workers)
         self.logger.info(f'Running {len(analyses_to_run)} analyses in parallel with {max_workers} workers')
-        if self.memory_efficient and len(analyses_to_run) > max_workers:
-            batch_size = max(1, max_workers // 2)
-            self.logger.info(f'Memory efficient mode: processing in batches of {batch_size}')
-            for i in range(0, len(analyses_to_run), batch_size):
-                batch = analyses_to_run[i:i + batch_size]
-                batch_success = self._execute_parallel_batch(batch, timestep, max_workers)
-                success = success and batch_success
-                self.parser.clear_data_cache()
-                gc.collect()
-        else:
-            success = self._execute_parallel_batch(analyses_to_run, timestep, max_workers)
+        # Every worker opens the trajectory once and reuses that parser for
+        # all the analyses it runs; only the analysis method is shipped per task
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(self.parser.filename,)
+        ) as executor:
+            if self.memory_efficient and len(analyses_to_run) > max_workers:
+                batch_size = max(1, max_workers // 2)
+                self.logger.info(f'Memory efficient mode: processing in batches of {batch_size}')
+                for i in range(0, len(analyses_to_run), batch_size):
+                    batch = analyses_to_run[i:i + batch_size]
+                    batch_success = self._execute_parallel_batch(executor, batch, timestep, output_folder)
+                    success = success and batch_success
+                    gc.collect()
+            else:
+                success = self._execute_parallel_batch(executor, analyses_to_run, timestep, output_folder)
         return success
 
-    def _execute_parallel_batch(self, analyses_batch, timestep, max_workers):
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            futures = {
-                executor.submit(function, timestep): name
-                for name, function in analyses_batch
-            }
-
-            for future in as_completed(futures):
-                name = futures[future]
-                try:
-                    result = future.result()
-                    if result:
-                        self.logger.info(f'Completed "{name}" analysis')
-                    else:
-                        self.logger.error(f'"{name}" analysis reported failure')
-                        success = False    
-                except Exception as e:
-                    self.logger.error(f'Error in "{name}" analysis: {e}')
+    def _execute_parallel_batch(self, executor, analyses_batch, timestep, output_folder):
+        success = True
+        futures = {
+            executor.submit(_run_worker_analysis, function, timestep, output_folder, self.memory_efficient): name
+            for name, function in analyses_batch
+        }
+
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+                if result:
+                    self.logger.info(f'Completed "{name}" analysis')
+                else:
+                    self.logger.error(f'"{name}" analysis reported failure')
                     success = False
+            except Exception as e:
+                self.logger.error(f'Error in "{name}" analysis: {e}')
+                success = False
         return success
     
-    
     def _get_analyses_to_run(self, analysis_type):
         if not analysis_type:
             return list(self.analysis_registry.items())
@@ -200,34 +221,10 @@ class Analyzer:
         self.logger.info(f'Available types: {", ".join(self.analysis_registry.keys())}')
         return []
     
-    def _execute_analyses(self, analyses, timestep):
-        success = True
-        max_workers = min(len(analyses), os.cpu_count() or 1)
-
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            futures = {
-                executor.submit(function, timestep): name
-                for name, function in analyses
-            }
-
-            for future in as_completed(futures):
-                name = futures[future]
-                try:
-                    result = future.result()
-                    if result:
-                        self.logger.info(f'Completed "{name}" analysis')
-                    else:
-                        self.logger.error(f'"{name}" analysis reported failure')
-                        success = False 
-                except Exception as e:
-                    self.logger.error(f'Error in "{name}" analysis: {e}')
-                    success = False
-        return success
-                    
-    def run_cna_analysis(self, timestep: int = -1) -> bool:
+    def run_cna_analysis(self, parser: BaseParser, timestep: int = -1, output_folder: str = '.') -> bool:
         self.logger.info('Initializing CNA analysis')
         
-        visualizer = visualizers.CommonNeighborAnalysisVisualizer(self.parser)
+        visualizer = visualizers.CommonNeighborAnalysisVisualizer(parser, output_folder)
 
         self.logger.info('Generating CNA distribution plot')
         visualizer.plot_structure_distribution(timestep)
@@ -243,10 +240,10 @@ class Analyzer:
 
         return True
 
-    def run_coordination_analysis(self, timestep: int = -1) -> bool:
+    def run_coordination_analysis(self, parser: BaseParser, timestep: int = -1, output_folder: str = '.') -> bool:
         self.logger.info('Initializing Coordination analysis')
         
-        visualizer = visualizers.CoordinationVisualizer(self.parser)
+        visualizer = visualizers.CoordinationVisualizer(parser, output_folder)
 
         self.logger.info('Generating coordination distribution plot')
         visualizer.plot_coord_distribution(timestep)
@@ -268,10 +265,10 @@ class Analyzer:
 
         return True
     
-    def run_debris_analysis(self, timestep: int = -1) -> bool:
+    def run_debris_analysis(self, parser: BaseParser, timestep: int = -1, output_folder: str = '.') -> bool:
         self.logger.info('Initializing Debris analysis')
         
-        visualizer = visualizers.DebrisVisualizer(self.parser)
+        visualizer = visualizers.DebrisVisualizer(parser, output_folder)
 
         self.logger.info('Generating cluster evolution plot')
         visualizer.plot_cluster_evolution()
@@ -290,10 +287,10 @@ class Analyzer:
         
         return True
 
-    def run_hotspot_analysis(self, timestep: int = -1) -> bool:
+    def run_hotspot_analysis(self, parser: BaseParser, timestep: int = -1, output_folder: str = '.') -> bool:
         self.logger.info('Initializing Hotspot analysis')
 
-        visualizer = visualizers.HotspotVisualizer(self.parser)
+        visualizer = visualizers.HotspotVisualizer(parser, output_folder)
 
         self.logger.info('Generating energy distribution plot')
         visualizer.plot_energy_distribution(timestep)
@@ -312,10 +309,10 @@ class Analyzer:
         
         return True
 
-    def run_vonmises_analysis(self, timestep: int = -1) -> bool:
+    def run_vonmises_analysis(self, parser: BaseParser, timestep: int = -1, output_folder: str = '.') -> bool:
         self.logger.info('Initializing von Mises analysis')
         
-        visualizer = visualizers.VonmisesVisualizer(self.parser)
+        visualizer = visualizers.VonmisesVisualizer(parser, output_folder)
 
         self.logger.info('Generating stress evolution plot')
         visualizer.plot_stress_evolution()
@@ -338,16 +335,16 @@ class Analyzer:
 
         return True
 
-    def run_centro_symmetric_analysis(self, timestep: int = -1) -> bool:
+    def run_centro_symmetric_analysis(self, parser: BaseParser, timestep: int = -1, output_folder: str = '.') -> bool:
         self.logger.info('Initializing Centro-Symmetric analysis')
         
-        visualizer = visualizers.CentroSymmetricVisualizer(self.parser)
+        visualizer = visualizers.CentroSymmetricVisualizer(parser, output_folder)
 
         self.logger.info('Generating Centro-Symmetric parameter distribution')
         visualizer.plot_centro_symmetric_distribution(timestep)
         visualizer.plot_centro_symmetric_distribution(timestep, log_scale=True)
 
-        timesteps = self.parser.get_timesteps()
+        timesteps = parser.get_timesteps()
         if len(timesteps) > 1:
             self.logger.info('Generating defect evolution plots')
             visualizer.plot_defect_evolution()
@@ -376,15 +373,15 @@ class Analyzer:
     
         return True
 
-    def run_velocity_squared_analysis(self, timestep: int = -1) -> bool:
+    def run_velocity_squared_analysis(self, parser: BaseParser, timestep: int = -1, output_folder: str = '.') -> bool:
         self.logger.info('Initializing Velocity Squared analysis')
         
-        visualizer = visualizers.VelocitySquaredVisualizer(self.parser)
+        visualizer = visualizers.VelocitySquaredVisualizer(parser, output_folder)
 
         self.logger.info('Generating temperature distribution plot')
         visualizer.plot_temperature_distribution(timestep)
         
-        timesteps = self.parser.get_timesteps()
+        timesteps = parser.get_timesteps()
         if len(timesteps) > 1:
             self.logger.info('Generating temperature evolution plots')
             visualizer.plot_temperature_evolution()
@@ -411,17 +408,17 @@ class Analyzer:
         
         return True
 
-    def run_energy_analysis(self, timestep: int = -1) -> bool:
+    def run_energy_analysis(self, parser: BaseParser, timestep: int = -1, output_folder: str = '.') -> bool:
         self.logger.info('Initializing Energy analysis')
             
-        visualizer = visualizers.EnergyVisualizer(self.parser)
+        visualizer = visualizers.EnergyVisualizer(parser, output_folder)
         
         self.logger.info('Generating energy distribution plots')
         visualizer.plot_energy_distribution(timestep, energy_type='kinetic')
         visualizer.plot_energy_distribution(timestep, energy_type='potential')
         visualizer.plot_energy_distribution(timestep, energy_type='total')
         
-        timesteps = self.parser.get_timesteps()
+        timesteps = parser.get_timesteps()
         if len(timesteps) > 1:
             self.logger.info('Generating energy evolution plots')
             visualizer.plot_energy_evolution(energy_type='kinetic')
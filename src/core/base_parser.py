@@ -1,12 +1,65 @@
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Union, Tuple
 from functools import lru_cache
 from concurrent.futures import ProcessPoolExecutor
-from numba import njit
-from core.helpers import init_worker, _load_segment
+from core.helpers import init_worker, parse_atoms_block, _load_segment
+from core.cache import get_cache_path, load_cached_arrays, save_cached_arrays
 import numpy as np
 import gc
 import mmap
 
+# Section markers of the LAMMPS dump format, shared by every parser instance
+TIMESTEP_MARKER = b'ITEM: TIMESTEP'
+ATOMS_MARKER = b'ITEM: ATOMS'
+ITEM_MARKER = b'ITEM:'
+
+# Mapping of analysis names to the per-atom dump columns they read from.
+# Built once at import so constructing a parser only resolves header indices.
+ANALYSIS_HEADERS = {
+    'centro_symmetric': 'c_center_symmetric',
+    'cna': 'c_cna',
+    'vonmises': 'v_atoms_stress',
+    'velocity_squared': 'v_velocity_squared_atom',
+    'cluster': 'c_cluster',
+    'ke_hotspots': 'c_ke_hotspots',
+    'is_hotspot': 'v_is_hotspot',
+    'coord': 'c_coord',
+    'ptm': ('c_ptm[1]', 'c_ptm[2]', 'c_ptm[3]', 'c_ptm[4]', 'c_ptm[5]', 'c_ptm[6]'),
+    'ke_mobile': 'c_ke_mobile',
+    'pe_mobile': 'c_pe_mobile',
+    'total_energy': 'v_total_energy'
+}
+
+# Reduced-precision storage for analyses whose values only feed means,
+# threshold comparisons and histograms. Halves the bytes every reduction reads.
+# Integer labels use the narrowest type that holds them: CNA classes (0-5) and
+# coordination numbers fit in a byte, cluster ids can reach the atom count.
+ANALYSIS_DTYPES = {
+    'centro_symmetric': np.float32,
+    'cna': np.uint8,
+    'coord': np.uint8,
+    'cluster': np.int32
+}
+
+def _storage_dtype(values: np.ndarray, dtype: np.dtype) -> np.dtype:
+    '''
+    Check that values fit the storage dtype of their analysis.
+
+    Args:
+        values: Column as parsed from the dump.
+        dtype: Storage dtype from ANALYSIS_DTYPES.
+
+    Returns:
+        dtype itself, or the narrowest integer type holding every value if
+        some fall outside its range (e.g. labels of a custom compute).
+    '''
+    if not np.issubdtype(dtype, np.integer) or values.size == 0:
+        return dtype
+    low, high = int(values.min()), int(values.max())
+    info = np.iinfo(dtype)
+    if info.min <= low and high <= info.max:
+        return dtype
+    return np.promote_types(np.min_scalar_type(low), np.min_scalar_type(high))
+
 class BaseParser:
     '''
     Base class for parsing large LAMMPS dump files using memory-mapped I/O.
@@ -17,6 +70,7 @@ class BaseParser:
         _timesteps (List[int]): List of timesteps found in the file.
         _timestep_atom_info (Dict[int, Tuple[int, int]]): Mapping from timestep to (start_offset, end_offset) in bytes.
         _headers (List[str]): List of atom data column headers from the file.
+        _header_index (Dict[str, int]): Mapping from column header to its index.
         _atoms_spatial_coordinates_indices (List[int]): Indices of x, y, z columns in data arrays.
         _analysis_column_map (Dict[str, Union[int, List[int]]]): Mapping of analysis types to column indices.
         _metadata (Dict[str, Any]): Additional metadata parsed from the file.
@@ -30,10 +84,12 @@ class BaseParser:
         '_timesteps',
         '_timestep_atom_info',
         '_headers',
+        '_header_index',
         '_atoms_spatial_coordinates_indices',
         '_analysis_column_map',
         '_metadata',
-        '_box_bounds'
+        '_box_bounds',
+        '_group_bounds'
     )
 
     def __init__(self, filename: str):
@@ -44,18 +100,23 @@ class BaseParser:
             filename: Path to the trajectory file to parse.
         '''
         self.filename = filename
-        file = open(self.filename, 'r+b')
-        self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        # Read-only map; the descriptor can be closed once the map exists
+        with open(self.filename, 'rb') as file:
+            self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
 
         self._timesteps: List[int] = []
         self._timestep_atom_info: Dict[int, tuple[int, int]] = {}
 
         self._headers: List[str] = []
+        self._header_index: Dict[str, int] = {}
         self._atoms_spatial_coordinates_indices: List[int] = []
         self._analysis_column_map: Dict[str, Union[int, List[int]]] = {}
 
         self._metadata: Dict[str, Any] = {}
         self._box_bounds = None
+        # (lower_end, upper_start) bounds of the planes per timestep,
+        # filled lazily by _get_group_bounds
+        self._group_bounds: Dict[int, Tuple[int, int]] = None
 
         self._index_file()
 
@@ -69,7 +130,7 @@ class BaseParser:
         size = self._mm.size()
         offset = 0
         while True:
-            position_timestep = self._mm.find(b'ITEM: TIMESTEP', offset)
+            position_timestep = self._mm.find(TIMESTEP_MARKER, offset)
             if position_timestep < 0:
                 break
             self._mm.seek(position_timestep)
@@ -80,7 +141,7 @@ class BaseParser:
             except ValueError:
                 break
             self._timesteps.append(timestep)
-            position_atoms = self._mm.find(b'ITEM: ATOMS', self._mm.tell())
+            position_atoms = self._mm.find(ATOMS_MARKER, self._mm.tell())
             if position_atoms < 0:
                 break
             self._mm.seek(position_atoms)
@@ -89,10 +150,11 @@ class BaseParser:
             if not self._headers:
                 parts = atom_header.split()[2:]
                 self._headers = [p.decode() for p in parts]
+                self._header_index = {header: idx for idx, header in enumerate(self._headers)}
                 self._parse_atoms_spatial_coordinates_indices()
                 self._create_analysis_column_map()
             data_start = self._mm.tell()
-            next_item = self._mm.find(b'ITEM:', data_start)
+            next_item = self._mm.find(ITEM_MARKER, data_start)
             data_end = next_item if next_item >= 0 else size
             self._timestep_atom_info[timestep] = (data_start, data_end)
             offset = data_end
@@ -109,7 +171,9 @@ class BaseParser:
             timestep: The timestep number to load.
 
         Returns:
-            A 2D numpy array with shape (n_atoms, n_columns).
+            A 2D numpy array with shape (n_atoms, n_columns), stored column-major
+            so every per-atom column is a contiguous 1D array. Rows keep the
+            dump order.
 
         Raises:
             ValueError: If the timestep is not indexed or reshape fails.
@@ -117,13 +181,10 @@ class BaseParser:
         if timestep not in self._timestep_atom_info:
             raise ValueError(f'Timestep {timestep} not found in file.')
         start, end = self._timestep_atom_info[timestep]
-        segment = self._mm[start:end]
-        flat = np.fromstring(segment, sep=' ')
-        n_cols = len(self._headers)
         try:
-            return flat.reshape(-1, n_cols)
-        except ValueError:
-            raise ValueError(f'Data reshape error for timestep {timestep}: {flat.size} values for {n_cols} columns.')
+            return parse_atoms_block(self._mm[start:end], len(self._headers))
+        except ValueError as error:
+            raise ValueError(f'Timestep {timestep}: {error}') from None
 
     def _parse_atoms_spatial_coordinates_indices(self):
         '''
@@ -131,34 +192,16 @@ class BaseParser:
         Falls back to default positions if headers are missing.
         '''
         try:
-            x_idx = self._headers.index('x')
-            y_idx = self._headers.index('y')
-            z_idx = self._headers.index('z')
-        except ValueError:
+            x_idx = self._header_index['x']
+            y_idx = self._header_index['y']
+            z_idx = self._header_index['z']
+        except KeyError:
             print('WARNING: The headers do not contain "x", "y", or "z". This is a critical error, and nothing may work as expected. Set the expected positions (2, 3, and 4, respectively).')
             x_idx = 2
             y_idx = 3
             z_idx = 4
         self._atoms_spatial_coordinates_indices = [x_idx, y_idx, z_idx]
 
-    def _load_segment(args):
-        '''
-        Helper for parallel loading of file segments.
-
-        Args:
-            args: Tuple (filename, start, end, n_cols)
-
-        Returns:
-            A 2D numpy array of the segment data.
-        '''
-        filename, start, end, n_cols = args
-        with open(filename, 'r+b') as file:
-            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
-            segment = mm[start:end]
-            mm.close()
-        flat = np.fromstring(segment, sep=' ')
-        return flat.reshape(-1, n_cols)
-
     def _load_all_timesteps(self):
         '''
         Load all timesteps in parallel using a ProcessPoolExecutor.
@@ -181,25 +224,13 @@ class BaseParser:
         Build a mapping from analysis names to header indices.
         Supports both single and multi-column analyses.
         '''
-        analysis_headers = {
-            'centro_symmetric': 'c_center_symmetric',
-            'cna': 'c_cna',
-            'vonmises': 'v_atoms_stress',
-            'velocity_squared': 'v_velocity_squared_atom',
-            'cluster': 'c_cluster',
-            'ke_hotspots': 'c_ke_hotspots',
-            'is_hotspot': 'v_is_hotspot',
-            'coord': 'c_coord',
-            'ptm': ['c_ptm[1]', 'c_ptm[2]', 'c_ptm[3]', 'c_ptm[4]', 'c_ptm[5]', 'c_ptm[6]']
-        }
-
-        for analysis_type, header in analysis_headers.items():
-            if isinstance(header, list):
-                idxs = [self._headers.index(h) for h in header if h in self._headers]
+        for analysis_type, header in ANALYSIS_HEADERS.items():
+            if isinstance(header, tuple):
+                idxs = [self._header_index[h] for h in header if h in self._header_index]
                 if idxs:
                     self._analysis_column_map[analysis_type] = idxs
-            elif header in self._headers:
-                self._analysis_column_map[analysis_type] = self._headers.index(header)
+            elif header in self._header_index:
+                self._analysis_column_map[analysis_type] = self._header_index[header]
         print(f'Analysis column map created: {self._analysis_column_map}')
     
     def get_analysis_data(
@@ -227,15 +258,83 @@ class BaseParser:
 
         if timestep_idx < 0:
             timestep_idx = len(self._timesteps) + timestep_idx
-        
-        timestep_data = self._get_timestep_data(timestep_idx)
 
         if isinstance(column_idx, list):
             # Return multiple columns for array data
+            timestep_data = self._get_timestep_data(timestep_idx)
             return [timestep_data[:, i] for i in column_idx]
-        
-        return timestep_data[:, column_idx]
-    
+
+        return self._load_analysis_column(self._timesteps[timestep_idx], analysis_type)
+
+    @lru_cache(maxsize=128)
+    def _load_analysis_column(self, timestep: int, analysis_type: str) -> np.ndarray:
+        '''
+        Load and memoize a single analysis column in its storage dtype.
+
+        Evolution methods sweep every timestep, often several times per analysis,
+        which would evict whole frames from the small frame cache. Columns are
+        copied out of their frame, so this cache only holds n_atoms values per
+        entry and does not keep the full frame alive.
+
+        Args:
+            timestep: The timestep number to load.
+            analysis_type: Key of a single-column analysis in the column map.
+
+        Returns:
+            Contiguous, read-only 1D numpy array of the column.
+        '''
+        column_idx = self._analysis_column_map[analysis_type]
+        column = self._load_timestep_data(timestep)[:, column_idx]
+        dtype = ANALYSIS_DTYPES.get(analysis_type, np.float64)
+        column = column.astype(_storage_dtype(column, dtype))
+        # Every caller gets this same array, so it must not be modified in place
+        column.setflags(write=False)
+        return column
+
+    def get_analysis_data_stacked(
+        self,
+        analysis_type: str,
+        group: str = None,
+        column: int = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Concatenate a single-column analysis over every timestep so per-frame
+        statistics can be computed with one batched reduction.
+
+        Args:
+            analysis_type: Key of the desired analysis in the column map.
+            group: Optional atom group to keep in each frame.
+            column: Position of the column to stack for analyses that span
+                several columns (e.g. 0 for c_ptm[1]).
+
+        Returns:
+            Tuple (values, offsets) where frame i occupies values[offsets[i]:offsets[i + 1]].
+            Frames may hold different atom counts.
+
+        Raises:
+            ValueError: If analysis_type is not found, or spans several columns
+                and no column is given.
+        '''
+        if analysis_type not in self._analysis_column_map:
+            raise ValueError(f'Analysis type "{analysis_type}" not found in headers: {self._headers}')
+
+        column_idx = self._analysis_column_map[analysis_type]
+        if isinstance(column_idx, list) and column is None:
+            raise ValueError(f'Analysis type "{analysis_type}" spans several columns and cannot be stacked.')
+
+        frames = []
+        for timestep_idx in range(len(self._timesteps)):
+            values = self.get_analysis_data(analysis_type, timestep_idx)
+            if column is not None:
+                values = values[column]
+            if group is not None and group != 'all':
+                values = values[self.get_timestep_atom_groups(timestep_idx)[group]]
+            frames.append(values)
+
+        offsets = np.zeros(len(frames) + 1, dtype=np.int64)
+        np.cumsum([len(values) for values in frames], out=offsets[1:])
+        return np.concatenate(frames), offsets
+
     def _get_timestep_data(self, timestep_idx):
         '''
         Internal helper to get data array by timestep index.
@@ -256,26 +355,131 @@ class BaseParser:
         Clear the LRU cache of loaded timesteps and force garbage collection.
         '''
         self._load_timestep_data.cache_clear()
+        self._load_analysis_column.cache_clear()
+        self._load_group_order.cache_clear()
         gc.collect()
 
-    def get_atom_group_indices(self, data):
+    def _get_plane_masks(self, timestep: int) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Classify the atoms of a timestep into the lower and upper planes:
+        atoms within 2.5 of the lowest and of the highest z. The planes
+        overlap in a very thin sample.
+
+        Args:
+            timestep: The timestep number to classify.
+
+        Returns:
+            Tuple (in_lower, in_upper) of boolean masks over the frame's rows.
+        '''
+        z = self._load_timestep_data(timestep)[:, self._atoms_spatial_coordinates_indices[2]]
+        if z.shape[0] == 0:
+            return np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)
+        return z <= z.min() + 2.5, z >= z.max() - 2.5
+
+    @lru_cache(maxsize=128)
+    def _load_group_order(self, timestep: int) -> np.ndarray:
+        '''
+        Compute and memoize the permutation of a timestep's rows that lists
+        the lower plane, the nanoparticle and the upper plane one after
+        another. Atoms in both planes sit between the two, so each plane is
+        still a prefix or suffix of the permutation. Rows keep their dump
+        order within each group.
+
+        Group evolutions sweep every timestep once per group, so this cache
+        is sized like the analysis column cache.
+
+        Args:
+            timestep: The timestep number to classify.
+
+        Returns:
+            Read-only 1D array of row indices, split by _get_group_bounds.
+        '''
+        in_lower, in_upper = self._get_plane_masks(timestep)
+        # 0 lower plane only, 1 nanoparticle or both planes, 2 upper plane only.
+        # A stable sort of these small keys is a linear-time radix sort
+        rank = 1 - in_lower.view(np.int8) + in_upper.view(np.int8)
+        order = np.argsort(rank, kind='stable')
+        # int32 indices halve the bytes every group gather reads
+        if order.shape[0] <= np.iinfo(np.int32).max:
+            order = order.astype(np.int32)
+        # Every caller gets this same array, so it must not be modified in place
+        order.setflags(write=False)
+        return order
+
+    def _get_group_bounds(self, timestep: int) -> Tuple[int, int]:
+        '''
+        Bounds of the lower and upper planes in the permutation of
+        _load_group_order. With the disk cache enabled (see core.cache), the
+        bounds of every timestep are kept in a single entry per trajectory,
+        written once all are known.
+
+        Args:
+            timestep: The timestep number to classify.
+
+        Returns:
+            Tuple (lower_end, upper_start): the lower plane spans positions
+            [0, lower_end) of the permutation and the upper plane positions
+            [upper_start, n_atoms).
+        '''
+        if self._group_bounds is None:
+            self._group_bounds = {}
+            cached = load_cached_arrays(get_cache_path(self.filename, 'group-bounds'))
+            if cached is not None and 'timesteps' in cached and 'bounds' in cached:
+                for cached_timestep, (lower_end, upper_start) in zip(cached['timesteps'], cached['bounds']):
+                    self._group_bounds[int(cached_timestep)] = (int(lower_end), int(upper_start))
+        if timestep in self._group_bounds:
+            return self._group_bounds[timestep]
+        in_lower, in_upper = self._get_plane_masks(timestep)
+        lower_end = int(np.count_nonzero(in_lower))
+        upper_start = in_upper.shape[0] - int(np.count_nonzero(in_upper))
+        self._group_bounds[timestep] = (lower_end, upper_start)
+        if len(self._group_bounds) == len(self._timesteps):
+            save_cached_arrays(get_cache_path(self.filename, 'group-bounds'), {
+                'timesteps': np.array(self._timesteps, dtype=np.int64),
+                'bounds': np.array([self._group_bounds[t] for t in self._timesteps], dtype=np.int64)
+            })
+        return lower_end, upper_start
+
+    def get_timestep_group_order(self, timestep_idx: int = -1) -> Tuple[np.ndarray, int, int]:
+        '''
+        Return the group permutation of a timestep and its bounds, for
+        reductions that handle every group in one pass: gathering a column
+        by the permutation makes each group a contiguous range.
+
+        Args:
+            timestep_idx: Index of the timestep (negative for relative indexing).
+
+        Returns:
+            Tuple (order, lower_end, upper_start) as described in
+            _load_group_order and _get_group_bounds.
+        '''
+        if timestep_idx < 0:
+            timestep_idx = len(self._timesteps) + timestep_idx
+        timestep = self._timesteps[timestep_idx]
+        lower_end, upper_start = self._get_group_bounds(timestep)
+        return self._load_group_order(timestep), lower_end, upper_start
+
+    def get_timestep_atom_groups(self, timestep_idx: int = -1) -> Dict[str, Union[np.ndarray, slice]]:
         '''
-        Identify indices of lower plane, upper plane, and nanoparticle groups.
+        Return the atom groups of a timestep, shared by every analyzer and
+        visualizer working on this parser. Atoms are not sorted by id in the
+        dump, so groups are resolved per timestep rather than once per file.
 
         Args:
-            data: Atom data array to analyze spatial positions.
+            timestep_idx: Index of the timestep (negative for relative indexing).
 
         Returns:
-            Dictionary with keys 'lower_plane', 'upper_plane', 'nanoparticle', 'all'.
+            Dictionary of row indices into the timestep's data (and its
+            analysis columns) with keys 'lower_plane', 'upper_plane',
+            'nanoparticle', and slice(None) under 'all'.
         '''
-        _, _, z = self.get_atoms_spatial_coordinates(data)
-        lower, upper = BaseParser._njit_group_indices(z)
-        nanoparticle = ~(lower | upper)
+        order, lower_end, upper_start = self.get_timestep_group_order(timestep_idx)
         return {
-            'lower_plane': np.where(lower)[0],
-            'upper_plane': np.where(upper)[0],
-            'nanoparticle': np.where(nanoparticle)[0],
-            'all': np.arange(data.shape[0])
+            'lower_plane': order[:lower_end],
+            'upper_plane': order[upper_start:],
+            # Empty when the planes overlap
+            'nanoparticle': order[lower_end:max(lower_end, upper_start)],
+            'all': slice(None)
         }
         
     def get_atoms_spatial_coordinates(self, data):
@@ -311,7 +515,8 @@ class BaseParser:
         if isinstance(timestep_idx, int):
             return self._get_timestep_data(timestep_idx)
     
-        if timestep_idx in self._timesteps:
+        # Dict lookup instead of scanning the timesteps list
+        if timestep_idx in self._timestep_atom_info:
             return self._load_timestep_data(timestep_idx)
 
         raise ValueError(f'Timestep {timestep_idx} not found')
@@ -327,6 +532,13 @@ class BaseParser:
         Return the sorted list of timesteps available in the file.
         '''
         return self._timesteps
+
+    @property
+    def num_timesteps(self) -> int:
+        '''
+        Number of timesteps indexed in the file.
+        '''
+        return len(self._timesteps)
     
     def get_column_data(self, column_name: str, timestep_idx: int = -1) -> np.ndarray:
         '''
@@ -342,9 +554,9 @@ class BaseParser:
         Raises:
             ValueError: If column is not found.
         '''
-        if column_name not in self._headers:
+        column = self._header_index.get(column_name)
+        if column is None:
             raise ValueError(f'Column {column_name} does not exists in headers.')
-        column = self._headers.index(column_name)
         return self._get_timestep_data(timestep_idx)[:, column]
 
     def get_metadata(self) -> Dict[str, Any]:
@@ -357,7 +569,7 @@ class BaseParser:
         '''
         Return integer array of atom types for the given timestep.
         '''
-        column = self._headers.index('type')
+        column = self._header_index['type']
         return self._get_timestep_data(timestep_idx)[:, column].astype(np.int64)
 
     def get_atom_count(self, timestep_idx: int = -1) -> int:
@@ -366,28 +578,14 @@ class BaseParser:
         '''
         return self._get_timestep_data(timestep_idx).shape[0]
     
-    @staticmethod
-    @njit
-    def _njit_group_indices(z: np.ndarray):
+    def __reduce__(self):
         '''
-        Numba-accelerated detection of lower/upper plane atom indices.
-
-        Args:
-            z: 1D array of z-coordinates.
+        Pickle the parser by filename so it can be shipped to worker processes.
+        The memory map cannot be pickled; the receiving process re-opens and
+        re-indexes the file.
+        '''
+        return (BaseParser, (self.filename,))
 
-        Returns:
-            Two boolean arrays: (lower_mask, upper_mask).
-        '''
-        z_min = z.min()
-        z_max = z.max()
-        n = z.shape[0]
-        lower = np.empty(n, np.bool_)
-        upper = np.empty(n, np.bool_)
-        for i in range(n):
-            lower[i] = z[i] <= z_min + 2.5
-            upper[i] = z[i] >= z_max - 2.5
-        return lower, upper
-    
     def __del__(self):
         '''
         Ensure memory-mapped file is closed on deletion.
@@ -0,0 +1,78 @@
+from typing import Dict, Optional
+import numpy as np
+import hashlib
+import threading
+import os
+
+# The disk cache is opt-in: entries are only read and written when this
+# environment variable names a directory (inherited by worker processes)
+CACHE_DIR_VARIABLE = 'TRYBO_CACHE_DIR'
+
+def get_cache_path(filename: str, kind: str, *key_parts) -> Optional[str]:
+    '''
+    Build the path of an on-disk cache entry derived from a trajectory.
+
+    The key hashes the trajectory path, size and modification time together
+    with the given parts, so entries of a rewritten file are never reused.
+
+    Args:
+        filename: Path to the trajectory file the entry derives from.
+        kind: Short name of the cached quantity, used in the file name.
+        *key_parts: Extra values identifying the entry.
+
+    Returns:
+        Path of the .npz cache file inside the cache directory, or None if
+        the cache is disabled.
+    '''
+    cache_dir = os.environ.get(CACHE_DIR_VARIABLE)
+    if not cache_dir:
+        return None
+    stat = os.stat(filename)
+    fields = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns) + key_parts
+    key = hashlib.blake2b('-'.join(map(str, fields)).encode(), digest_size=8).hexdigest()
+    return os.path.join(cache_dir, f'{os.path.basename(filename)}.{kind}.{key}.npz')
+
+def load_cached_arrays(path: str) -> Optional[Dict[str, np.ndarray]]:
+    '''
+    Read every array of a cache entry.
+
+    Args:
+        path: Path returned by get_cache_path.
+
+    Returns:
+        Dictionary of arrays, or None if the entry is missing or unreadable
+        or the cache is disabled.
+    '''
+    if path is None:
+        return None
+    try:
+        with np.load(path) as entry:
+            return {name: entry[name] for name in entry.files}
+    except (OSError, ValueError):
+        return None
+
+def save_cached_arrays(path: str, arrays: Dict[str, np.ndarray]):
+    '''
+    Write a cache entry. Failures (e.g. a read-only directory) are ignored,
+    the cache only saves work on later runs. Nothing is written when the
+    cache is disabled.
+
+    Args:
+        path: Path returned by get_cache_path.
+        arrays: Arrays to store, by name.
+    '''
+    if path is None:
+        return
+    # Write under a temporary name first so concurrent readers never see
+    # a partially written entry
+    temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temporary_path, 'wb') as file:
+            np.savez_compressed(file, **arrays)
+        os.replace(temporary_path, path)
+    except OSError:
+        try:
+            os.remove(temporary_path)
+        except OSError:
+            pass
@@ -1,15 +1,42 @@
 import numpy as np
+import io
 import mmap
 
 mm_global = None
 
 def init_worker(filename):
     global mm_global
-    f = open(filename, 'r+b')
-    mm_global = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with open(filename, 'rb') as file:
+        mm_global = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def parse_atoms_block(block, n_cols):
+    '''
+    Parse the per-atom rows of one frame. Shared by the lazy and the bulk
+    loaders so both return the same row order and layout.
+
+    Args:
+        block: Raw bytes of the frame's atom rows.
+        n_cols: Number of columns declared in the header.
+
+    Returns:
+        A 2D numpy array with shape (n_atoms, n_cols), stored column-major,
+        with the rows in dump order.
+
+    Raises:
+        ValueError: If the rows do not hold n_cols columns.
+    '''
+    if not block.strip():
+        # np.loadtxt would return shape (0, 1) for a frame without atoms
+        return np.empty((0, n_cols), dtype=np.float64, order='F')
+    # np.loadtxt tokenizes the whole block in one C call; np.fromstring's
+    # text mode, used before, is deprecated by NumPy
+    data = np.loadtxt(io.BytesIO(block), dtype=np.float64, ndmin=2)
+    if data.shape[1] != n_cols:
+        raise ValueError(f'Data reshape error: {data.shape[1]} columns found, {n_cols} expected.')
+    # Keep columns contiguous (structure of arrays): analyses read one
+    # column at a time, and a row-major slice would stride over every row
+    return np.asfortranarray(data)
 
 def _load_segment(range_args):
     start, end, n_cols = range_args
-    seg = mm_global[start:end]
-    flat = np.fromstring(seg, sep=' ')
-    return flat.reshape(-1, n_cols)
+    return parse_atoms_block(mm_global[start:end], n_cols)
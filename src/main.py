@@ -1,6 +1,7 @@
 from core.yaml_config import YamlConfig, BUILDS_DIR
 from core.analyzer import Analyzer
 from core.simulation_runner import SimulationRunner
+from core.cache import CACHE_DIR_VARIABLE
 
 import argparse
 import os
@@ -51,6 +52,12 @@ def parse_args():
         default=0,
         help='Maximum number of parallel workers. Default: number of CPU cores.'
     )
+    parser.add_argument(
+        '--cache-dir',
+        type=str,
+        default=None,
+        help='Directory where reductions of a trajectory (e.g. atom group bounds) are cached between runs. Disabled by default.'
+    )
     parser.add_argument(
         '--analysis-type',
         type=str,
@@ -64,18 +71,27 @@ def load_config(yaml_file: str, output_dir: str) -> YamlConfig:
         sys.exit('Error: failed to load YAML configuration.')
     return config
 
-def run_analysis_mode(yaml_file: str, dump_folder: str) -> None:
+def configure_analyzer(analyzer: Analyzer, args: argparse.Namespace) -> None:
+    if args.memory_efficient or args.normal_memory:
+        analyzer.enable_memory_efficient_mode(not args.normal_memory)
+    if args.parallel or args.sequential:
+        analyzer.enable_parallel_execution(not args.sequential)
+    if args.max_workers > 0:
+        analyzer.max_workers = args.max_workers
+
+def run_analysis_mode(yaml_file: str, dump_folder: str, args: argparse.Namespace) -> None:
     config = load_config(yaml_file, BUILDS_DIR)
     config.analysis_output_path = os.path.join(dump_folder, 'analysis')
     analyzer = Analyzer(yaml_config=config, dump_folder=dump_folder)
+    configure_analyzer(analyzer, args)
 
-    if analyzer.run_analysis():
+    if analyzer.run_analysis(args.analysis_type):
         print('Analysis completed successfully.')
         print(f'Results available at: {config.get_analysis_output_path()}')
         sys.exit(0)
     sys.exit('Error: analysis failed.')
 
-def run_full_mode(yaml_file: str, output_dir: str) -> None:
+def run_full_mode(yaml_file: str, output_dir: str, args: argparse.Namespace) -> None:
     # Load configuration and render simulation template
     config = load_config(yaml_file, output_dir)
     if not config.render_template():
@@ -85,11 +101,12 @@ def run_full_mode(yaml_file: str, output_dir: str) -> None:
     if not runner.execute():
         sys.exit('Error: simulation failed.')
     analyzer = Analyzer(yaml_config=config, dump_folder=simulation_path)
+    configure_analyzer(analyzer, args)
 
     print('Simulation completed successfully.')
 
     # Execute analysis
-    if not analyzer.run_analysis():
+    if not analyzer.run_analysis(args.analysis_type):
         sys.exit('Error: analysis failed.')
     print('Analysis completed successfully.')
     print(f'\nResults available at: {config.get_analysis_output_path()}')
@@ -97,14 +114,17 @@ def run_full_mode(yaml_file: str, output_dir: str) -> None:
 
 def main():
     args = parse_args()
+    if args.cache_dir:
+        # Read by core.cache, here and in the analysis worker processes
+        os.environ[CACHE_DIR_VARIABLE] = os.path.abspath(args.cache_dir)
     
     if args.analysis_only:
         if not args.dir:
             sys.exit('Error: in --analysis-only mode you must specify a dump folder (--dir).')
-        run_analysis_mode(args.config, args.dir)
+        run_analysis_mode(args.config, args.dir, args)
     else:
         output_dir = args.dir or BUILDS_DIR
-        run_full_mode(args.config, output_dir)
+        run_full_mode(args.config, output_dir, args)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
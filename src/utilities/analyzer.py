@@ -1,3 +1,14 @@
+from concurrent.futures import ThreadPoolExecutor
+
+def map_timesteps(function, n_timesteps, parallel=True, max_workers=None):
+    # Timesteps are independent, so per-frame work is spread over threads.
+    # Parsing, NumPy reductions and CuPy transfers spend most of their time
+    # outside the GIL, and threads share the parser's frame caches.
+    if not parallel or n_timesteps < 2:
+        return [function(i) for i in range(n_timesteps)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(function, range(n_timesteps)))
+
 def get_data_from_coord_axis(axis, coords):
     x, y, z = coords
     values = {
@@ -8,6 +19,4 @@ def get_data_from_coord_axis(axis, coords):
     return values.get(axis, z)
 
 def get_atom_group_indices(parser, timestep_idx):
-    data = parser.get_data(timestep_idx)
-    atom_groups = parser.get_atom_group_indices(data)
-    return atom_groups
\ No newline at end of file
+    return parser.get_timestep_atom_groups(timestep_idx)
\ No newline at end of file
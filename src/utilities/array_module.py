@@ -0,0 +1,50 @@
+from time import perf_counter
+import numpy as np
+import cupy as cp
+
+CALIBRATION_SIZE = 100_000
+DEFAULT_GPU_THRESHOLD = 100_000
+
+def _time_call(function, repeats=5):
+    function()
+    start = perf_counter()
+    for _ in range(repeats):
+        function()
+    return (perf_counter() - start) / repeats
+
+def _calibrate_gpu_threshold():
+    # Below some size the upload, kernel launch and download cost more than
+    # the NumPy reduction itself. Time one bincount of CALIBRATION_SIZE
+    # elements on each side and treat the GPU time as a fixed latency, so
+    # the crossover is where the (linear) CPU time catches up with it.
+    try:
+        # Fixed sample; the global random state is left untouched
+        values = np.arange(CALIBRATION_SIZE) % 16
+        cpu_time = _time_call(lambda: np.bincount(values))
+        def gpu_round_trip():
+            cp.asnumpy(cp.bincount(cp.asarray(values)))
+        gpu_time = _time_call(gpu_round_trip)
+    except Exception:
+        return DEFAULT_GPU_THRESHOLD
+    if cpu_time <= 0:
+        return DEFAULT_GPU_THRESHOLD
+    threshold = int(CALIBRATION_SIZE * gpu_time / cpu_time)
+    return min(max(threshold, 1_000), 10_000_000)
+
+# Calibrated on the first get_array_module call, not at import: the benchmark
+# creates a CUDA context, which must not exist in a process that later forks
+# its analysis workers (nor is it needed for e.g. --help)
+_gpu_threshold = None
+
+def get_gpu_threshold():
+    global _gpu_threshold
+    if _gpu_threshold is None:
+        _gpu_threshold = _calibrate_gpu_threshold()
+    return _gpu_threshold
+
+def get_array_module(array, threshold=None):
+    # cupy for arrays worth a round trip to the device, numpy otherwise.
+    # cp.asnumpy accepts both, so callers can bring results back uniformly.
+    if threshold is None:
+        threshold = get_gpu_threshold()
+    return cp if np.size(array) >= threshold else np
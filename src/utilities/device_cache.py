@@ -0,0 +1,49 @@
+from collections import OrderedDict
+import cupy as cp
+
+# Share of the free device memory a cache may hold when no budget is given
+DEVICE_CACHE_FRACTION = 0.25
+
+def _default_budget():
+    # Read on first use, not at import, so no CUDA context is created in a
+    # process that later forks its analysis workers
+    try:
+        free_bytes, _ = cp.cuda.runtime.memGetInfo()
+    except Exception:
+        return 0
+    return int(free_bytes * DEVICE_CACHE_FRACTION)
+
+def _nbytes(value):
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(item) for item in value)
+    return getattr(value, 'nbytes', 0)
+
+class DeviceCache:
+    # Least-recently-used cache of device arrays owned by one analyzer, so
+    # entries are freed with it. Entries are evicted once their total size
+    # exceeds the byte budget; the newest one is always kept, even when it
+    # alone is larger than the budget.
+    def __init__(self, budget_bytes=None):
+        self.budget_bytes = budget_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, load):
+        # Cached value of key, or load() uploaded and stored under it
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+        if self.budget_bytes is None:
+            self.budget_bytes = _default_budget()
+        value = load()
+        size = _nbytes(value)
+        self._entries[key] = (value, size)
+        self.nbytes += size
+        while self.nbytes > self.budget_bytes and len(self._entries) > 1:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.nbytes -= evicted_size
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
@@ -0,0 +1,190 @@
+from numba import njit, prange, get_num_threads
+import numpy as np
+
+@njit(cache=True, nogil=True, parallel=True, error_model='numpy')
+def _binned_profile(coords, values, low, high, n_bins, threshold, n_chunks):
+    # Each thread fills its own row so the prange loop is free of write races
+    n = coords.shape[0]
+    chunk = (n + n_chunks - 1) // n_chunks
+    sums = np.zeros((n_chunks, n_bins))
+    counts = np.zeros((n_chunks, n_bins), np.int64)
+    above = np.zeros((n_chunks, n_bins), np.int64)
+    inverse_width = n_bins / (high - low) if high > low else 0.0
+    for c in prange(n_chunks):
+        for i in range(c * chunk, min(n, (c + 1) * chunk)):
+            b = int((coords[i] - low) * inverse_width)
+            # The upper edge belongs to the last bin, as in np.histogram
+            if b == n_bins and coords[i] <= high:
+                b = n_bins - 1
+            if b < 0 or b >= n_bins:
+                continue
+            sums[c, b] += values[i]
+            counts[c, b] += 1
+            if values[i] >= threshold:
+                above[c, b] += 1
+    return sums.sum(axis=0), counts.sum(axis=0), above.sum(axis=0)
+
+def binned_profile(coords, values, low, high, n_bins, threshold):
+    # Single pass over the atoms accumulating, per spatial bin, the sum of
+    # values, the atom count and how many values reach the threshold
+    return _binned_profile(coords, values, low, high, n_bins, threshold, get_num_threads())
+
+@njit(cache=True, nogil=True, parallel=True)
+def _min_max(values, n_chunks):
+    n = values.shape[0]
+    chunk = (n + n_chunks - 1) // n_chunks
+    minimums = np.full(n_chunks, np.inf)
+    maximums = np.full(n_chunks, -np.inf)
+    for c in prange(n_chunks):
+        for i in range(c * chunk, min(n, (c + 1) * chunk)):
+            x = values[i]
+            if x < minimums[c]:
+                minimums[c] = x
+            if x > maximums[c]:
+                maximums[c] = x
+    return minimums.min(), maximums.max()
+
+def min_max(values):
+    # Both extrema in one pass, e.g. for the range of a spatial profile
+    return _min_max(values, get_num_threads())
+
+@njit(cache=True, nogil=True, inline='always')
+def _bucket_index(x, edges):
+    # Number of edges <= x, i.e. searchsorted(edges, x, side='right').
+    # A linear scan is cheapest for the handful of class edges used by the
+    # analyzers; longer edge arrays are bisected.
+    n_edges = edges.shape[0]
+    if n_edges <= 5:
+        b = 0
+        for e in edges:
+            if x >= e:
+                b += 1
+        return b
+    low = 0
+    high = n_edges
+    while low < high:
+        middle = (low + high) // 2
+        if x >= edges[middle]:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+@njit(cache=True, nogil=True, error_model='numpy')
+def fused_statistics(values, edges):
+    # Sum, sum of squares, extrema and per-class counts in one traversal.
+    # Class b counts values with edges[b - 1] <= x < edges[b]; class 0 holds
+    # values below the first edge (same as searchsorted(side='right')).
+    total = 0.0
+    total_squares = 0.0
+    minimum = values[0]
+    maximum = values[0]
+    counts = np.zeros(edges.shape[0] + 1, np.int64)
+    for i in range(values.shape[0]):
+        x = values[i]
+        total += x
+        total_squares += x * x
+        if x < minimum:
+            minimum = x
+        if x > maximum:
+            maximum = x
+        counts[_bucket_index(x, edges)] += 1
+    return total, total_squares, minimum, maximum, counts
+
+@njit(cache=True, nogil=True, parallel=True, error_model='numpy')
+def _parallel_statistics(values, edges, n_chunks):
+    # Each thread reduces its own slice; partial results are merged serially
+    n = values.shape[0]
+    chunk = (n + n_chunks - 1) // n_chunks
+    totals = np.zeros(n_chunks)
+    totals_squares = np.zeros(n_chunks)
+    minimums = np.full(n_chunks, np.inf)
+    maximums = np.full(n_chunks, -np.inf)
+    counts = np.zeros((n_chunks, edges.shape[0] + 1), np.int64)
+    for c in prange(n_chunks):
+        start = c * chunk
+        end = min(n, start + chunk)
+        if end > start:
+            total, total_squares, minimum, maximum, chunk_counts = fused_statistics(values[start:end], edges)
+            totals[c] = total
+            totals_squares[c] = total_squares
+            minimums[c] = minimum
+            maximums[c] = maximum
+            counts[c] = chunk_counts
+    return totals.sum(), totals_squares.sum(), minimums.min(), maximums.max(), counts.sum(axis=0)
+
+def parallel_statistics(values, edges):
+    # fused_statistics split across all numba threads, for single large frames
+    return _parallel_statistics(values, edges, get_num_threads())
+
+@njit(cache=True, nogil=True, parallel=True, error_model='numpy')
+def segment_statistics(values, offsets, edges):
+    # fused_statistics for every frame of a stacked array, where frame t
+    # spans values[offsets[t]:offsets[t + 1]]. Frames are independent, so
+    # the prange over frames needs no per-thread accumulators.
+    n_frames = offsets.shape[0] - 1
+    totals = np.zeros(n_frames)
+    totals_squares = np.zeros(n_frames)
+    minimums = np.full(n_frames, np.inf)
+    maximums = np.full(n_frames, -np.inf)
+    counts = np.zeros((n_frames, edges.shape[0] + 1), np.int64)
+    for t in prange(n_frames):
+        start = offsets[t]
+        end = offsets[t + 1]
+        if end > start:
+            total, total_squares, minimum, maximum, frame_counts = fused_statistics(values[start:end], edges)
+            totals[t] = total
+            totals_squares[t] = total_squares
+            minimums[t] = minimum
+            maximums[t] = maximum
+            counts[t] = frame_counts
+    return totals, totals_squares, minimums, maximums, counts
+
+# Class edges for the statistics below: none, only the moments are needed
+NO_EDGES = np.empty(0, dtype=np.float64)
+
+def moments(values):
+    # Sum, population standard deviation and extrema in one parallel pass
+    total, total_squares, minimum, maximum, _ = parallel_statistics(values, NO_EDGES)
+    n = values.shape[0]
+    if n == 0:
+        return total, np.nan, np.nan, np.nan
+    mean = total / n
+    return total, np.sqrt(max(total_squares / n - mean * mean, 0.0)), minimum, maximum
+
+def segment_moments(values, offsets):
+    # moments of every frame of a stacked array (see segment_statistics);
+    # empty frames report a NaN standard deviation
+    totals, totals_squares, minimums, maximums, _ = segment_statistics(values, offsets, NO_EDGES)
+    return totals, segment_stds(totals, totals_squares, offsets), minimums, maximums
+
+def segment_stds(totals, totals_squares, offsets):
+    # Population standard deviation of every frame from its sums
+    counts = np.diff(offsets)
+    means = np.divide(totals, counts, out=np.full(counts.shape[0], np.nan), where=counts > 0)
+    variances = np.divide(totals_squares, counts, out=np.full(counts.shape[0], np.nan), where=counts > 0) - means * means
+    return np.sqrt(np.maximum(variances, 0.0))
+
+@njit(cache=True, nogil=True, parallel=True)
+def segment_bincount(labels, offsets, n_classes):
+    # Histogram of every frame of a stacked label array (frame t spans
+    # labels[offsets[t]:offsets[t + 1]]) without materializing frame ids.
+    # Labels outside [0, n_classes) are not counted.
+    n_frames = offsets.shape[0] - 1
+    counts = np.zeros((n_frames, n_classes), np.int64)
+    for t in prange(n_frames):
+        for i in range(offsets[t], offsets[t + 1]):
+            label = np.int64(labels[i])
+            if label >= 0 and label < n_classes:
+                counts[t, label] += 1
+    return counts
+
+@njit(cache=True, nogil=True, parallel=True)
+def segment_medians(values, offsets):
+    # Median of every frame of a stacked array; empty frames report NaN
+    n_frames = offsets.shape[0] - 1
+    medians = np.full(n_frames, np.nan)
+    for t in prange(n_frames):
+        if offsets[t + 1] > offsets[t]:
+            medians[t] = np.median(values[offsets[t]:offsets[t + 1]])
+    return medians
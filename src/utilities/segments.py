@@ -0,0 +1,154 @@
+from utilities.array_module import get_array_module
+from utilities import kernels
+import numpy as np
+import cupy as cp
+
+# Per-frame reductions of stacked arrays (frame t spans
+# values[offsets[t]:offsets[t + 1]], see BaseParser.get_analysis_data_stacked).
+# Small inputs are reduced by the numba kernels on the host, large ones by the
+# kernels below, which read each frame's bounds from the offsets instead of
+# building a frame id for every element.
+
+_SEGMENT_THREADS = 256
+# Blocks sharing one frame; each merges its partial result with atomics
+_SEGMENT_MAX_BLOCKS = 64
+# Frames are laid out on the grid's y dimension, which CUDA caps at 65535
+_SEGMENT_MAX_FRAMES = 65535
+
+_C_TYPES = {
+    np.dtype(np.bool_): 'bool',
+    np.dtype(np.uint8): 'unsigned char',
+    np.dtype(np.int8): 'signed char',
+    np.dtype(np.uint16): 'unsigned short',
+    np.dtype(np.int16): 'short',
+    np.dtype(np.uint32): 'unsigned int',
+    np.dtype(np.int32): 'int',
+    np.dtype(np.int64): 'long long',
+    np.dtype(np.float32): 'float',
+    np.dtype(np.float64): 'double'
+}
+
+# One histogram per frame: blocks (x) split a frame (y) and count into
+# shared memory, then merge their counters into the frame's output row
+_SEGMENT_BINCOUNT_SOURCE = r'''
+extern "C" __global__ void trybo_segment_bincount(const ELEMENT_T* labels, const long long* offsets, int n_classes, unsigned long long* out) {
+    extern __shared__ unsigned int counts[];
+    for (int k = threadIdx.x; k < n_classes; k += blockDim.x) counts[k] = 0;
+    __syncthreads();
+    long long frame = blockIdx.y;
+    long long stride = (long long) blockDim.x * gridDim.x;
+    for (long long i = offsets[frame] + (long long) blockIdx.x * blockDim.x + threadIdx.x; i < offsets[frame + 1]; i += stride) {
+        long long label = (long long) labels[i];
+        if (label >= 0 && label < n_classes) atomicAdd(&counts[label], 1u);
+    }
+    __syncthreads();
+    for (int k = threadIdx.x; k < n_classes; k += blockDim.x) {
+        if (counts[k]) atomicAdd(&out[frame * n_classes + k], (unsigned long long) counts[k]);
+    }
+}
+'''
+
+# Sum, sum of squares and extrema per frame: threads reduce a grid-stride
+# slice of their frame, warps combine with shuffles and one lane per warp
+# merges into the frame's output row
+_SEGMENT_MOMENTS_SOURCE = r'''
+__device__ void atomic_min_double(double* address, double value) {
+    unsigned long long* address_as_ull = (unsigned long long*) address;
+    unsigned long long old = *address_as_ull;
+    while (value < __longlong_as_double(old)) {
+        unsigned long long assumed = old;
+        old = atomicCAS(address_as_ull, assumed, __double_as_longlong(value));
+        if (old == assumed) break;
+    }
+}
+
+__device__ void atomic_max_double(double* address, double value) {
+    unsigned long long* address_as_ull = (unsigned long long*) address;
+    unsigned long long old = *address_as_ull;
+    while (value > __longlong_as_double(old)) {
+        unsigned long long assumed = old;
+        old = atomicCAS(address_as_ull, assumed, __double_as_longlong(value));
+        if (old == assumed) break;
+    }
+}
+
+extern "C" __global__ void trybo_segment_moments(const ELEMENT_T* values, const long long* offsets, double* out) {
+    long long frame = blockIdx.y;
+    double total = 0.0;
+    double total_squares = 0.0;
+    double minimum = __longlong_as_double(0x7ff0000000000000ULL);
+    double maximum = __longlong_as_double(0xfff0000000000000ULL);
+    long long stride = (long long) blockDim.x * gridDim.x;
+    for (long long i = offsets[frame] + (long long) blockIdx.x * blockDim.x + threadIdx.x; i < offsets[frame + 1]; i += stride) {
+        double x = (double) values[i];
+        total += x;
+        total_squares += x * x;
+        minimum = fmin(minimum, x);
+        maximum = fmax(maximum, x);
+    }
+    for (int offset = 16; offset > 0; offset /= 2) {
+        total += __shfl_down_sync(0xffffffff, total, offset);
+        total_squares += __shfl_down_sync(0xffffffff, total_squares, offset);
+        minimum = fmin(minimum, __shfl_down_sync(0xffffffff, minimum, offset));
+        maximum = fmax(maximum, __shfl_down_sync(0xffffffff, maximum, offset));
+    }
+    if ((threadIdx.x & 31) == 0) {
+        atomicAdd(&out[frame * 4], total);
+        atomicAdd(&out[frame * 4 + 1], total_squares);
+        atomic_min_double(&out[frame * 4 + 2], minimum);
+        atomic_max_double(&out[frame * 4 + 3], maximum);
+    }
+}
+'''
+
+_segment_bincount_kernels = {}
+_segment_moments_kernels = {}
+
+def _get_kernel(kernels_by_type, source, name, dtype):
+    # Kernels are compiled per element type on first use
+    dtype = np.dtype(dtype)
+    if dtype not in kernels_by_type:
+        kernels_by_type[dtype] = cp.RawKernel(source.replace('ELEMENT_T', _C_TYPES[dtype]), name)
+    return kernels_by_type[dtype]
+
+def _segment_grid(offsets):
+    # Enough blocks per frame to cover the largest one, within the cap
+    largest = int(np.diff(offsets).max(initial=0))
+    blocks = max(1, min(_SEGMENT_MAX_BLOCKS, -(-largest // _SEGMENT_THREADS)))
+    return (blocks, offsets.shape[0] - 1)
+
+def segment_bincount(labels, offsets, n_classes):
+    # (n_frames, n_classes) label counts of every frame, as a host array.
+    # Labels outside [0, n_classes) are not counted, so they can never
+    # spill into the next frame's row.
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_frames = offsets.shape[0] - 1
+    if get_array_module(labels) is np or not 0 < n_frames <= _SEGMENT_MAX_FRAMES:
+        return kernels.segment_bincount(cp.asnumpy(labels), offsets, n_classes)
+    labels_gpu = cp.asarray(labels)
+    counts_gpu = cp.zeros((n_frames, n_classes), dtype=cp.uint64)
+    kernel = _get_kernel(_segment_bincount_kernels, _SEGMENT_BINCOUNT_SOURCE, 'trybo_segment_bincount', labels_gpu.dtype)
+    kernel(
+        _segment_grid(offsets), (_SEGMENT_THREADS,),
+        (labels_gpu, cp.asarray(offsets), cp.int32(n_classes), counts_gpu),
+        shared_mem=n_classes * 4
+    )
+    return cp.asnumpy(counts_gpu).astype(np.int64)
+
+def segment_moments(values, offsets):
+    # kernels.segment_moments on whichever backend get_array_module picks:
+    # (sums, standard deviations, minimums, maximums) of every frame, as
+    # host arrays. Empty frames report a NaN deviation and infinite extrema.
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_frames = offsets.shape[0] - 1
+    if get_array_module(values) is np or not 0 < n_frames <= _SEGMENT_MAX_FRAMES:
+        return kernels.segment_moments(cp.asnumpy(values), offsets)
+    values_gpu = cp.asarray(values)
+    results_gpu = cp.empty((n_frames, 4))
+    results_gpu[:, :2] = 0.0
+    results_gpu[:, 2] = cp.inf
+    results_gpu[:, 3] = -cp.inf
+    kernel = _get_kernel(_segment_moments_kernels, _SEGMENT_MOMENTS_SOURCE, 'trybo_segment_moments', values_gpu.dtype)
+    kernel(_segment_grid(offsets), (_SEGMENT_THREADS,), (values_gpu, cp.asarray(offsets), results_gpu))
+    totals, totals_squares, minimums, maximums = cp.asnumpy(results_gpu).T
+    return totals, kernels.segment_stds(totals, totals_squares, offsets), minimums, maximums
@@ -0,0 +1,11 @@
+# Upper bound of points drawn for a context (background) scatter layer.
+# Beyond this the extra points are invisible at the saved resolution and
+# only add rasterization time.
+MAX_BACKGROUND_POINTS = 50000
+
+def downsample(*arrays, max_points=MAX_BACKGROUND_POINTS):
+    n_points = len(arrays[0])
+    if n_points <= max_points:
+        return arrays
+    stride = -(-n_points // max_points)
+    return tuple(array[::stride] for array in arrays)
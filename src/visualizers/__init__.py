@@ -1,3 +1,8 @@
+import matplotlib
+# Plots are only written to disk, so use the non-interactive backend. This
+# avoids loading a GUI toolkit and is safe inside worker processes.
+matplotlib.use('Agg')
+
 from .cna_visualizer import CommonNeighborAnalysisVisualizer
 from .coordination_visualizer import CoordinationVisualizer
 from .debris_visualizer import DebrisVisualizer
@@ -1,13 +1,16 @@
 from core.base_parser import BaseParser
 from analyzers.centro_symmetric_analyzer import CentroSymmetricAnalyzer
 from utilities.analyzer import get_atom_group_indices
+from utilities.visualizer import downsample
+import os
 import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
 
 class CentroSymmetricVisualizer:
-    def __init__(self, parser: BaseParser):
+    def __init__(self, parser: BaseParser, output_dir: str = '.'):
         self.parser = parser
+        self.output_dir = output_dir
         self.analyzer = CentroSymmetricAnalyzer(parser)
         # Color map for centro-symmetric parameter
         self.centro_symmetric_cmap = 'viridis'
@@ -22,14 +25,13 @@ class CentroSymmetricVisualizer:
     
     def plot_centro_symmetric_distribution(self, timestep_idx=-1, group=None, log_scale=False):
         timesteps = self.parser.get_timesteps()
-        data = self.parser.get_data(timestep_idx)
         current_timestep = timesteps[timestep_idx]
 
+        centro_symmetric_values = self.parser.get_analysis_data('centro_symmetric', timestep_idx)
         if group is not None and group != 'all':
             group_indices = get_atom_group_indices(self.parser, timestep_idx)[group]
-            data = data[group_indices]
+            centro_symmetric_values = centro_symmetric_values[group_indices]
 
-        centro_symmetric_values = data[:, 5]
         plt.figure(figsize=(12, 8))
         ax = sns.histplot(centro_symmetric_values, kde=True, bins=50)
         # Vertical lines for classification thresholds
@@ -64,7 +66,8 @@ class CentroSymmetricVisualizer:
         plt.grid(True, linestyle='--', alpha=0.7)
         plt.legend()
         plt.tight_layout()
-        plt.savefig(f'cs_distribution_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'cs_distribution_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
     
     def plot_defect_evolution(self, group=None):
         timesteps, evolution = self.analyzer.get_defect_evolution(group)
@@ -84,7 +87,8 @@ class CentroSymmetricVisualizer:
         plt.grid(True, linestyle='--', alpha=0.7)
         plt.legend()
         plt.tight_layout()
-        plt.savefig('defect_evolution.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, 'defect_evolution.png'), dpi=300)
+        plt.close()
 
         # Second plot for CS parameter values
         plt.figure(figsize=(12, 8))
@@ -103,19 +107,21 @@ class CentroSymmetricVisualizer:
         
         plt.tight_layout()
         
-        plt.savefig('cs_values_evolution.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, 'cs_values_evolution.png'), dpi=300)
+        plt.close()
 
     def plot_defect_3d(self, timestep_idx=-1, group=None):
         timesteps = self.parser.get_timesteps()
         
         data = self.parser.get_data(timestep_idx)
         current_timestep = timesteps[timestep_idx]
+        cs_values = self.parser.get_analysis_data('centro_symmetric', timestep_idx)
         if group is not None and group != 'all':
             group_indices = get_atom_group_indices(self.parser, timestep_idx)[group]
             data = data[group_indices]
+            cs_values = cs_values[group_indices]
         
         x, y, z = self.parser.get_atoms_spatial_coordinates(data)
-        cs_values = data[:, 5]
         
         classifications = self.analyzer.classify_atoms(cs_values)
         
@@ -137,7 +143,8 @@ class CentroSymmetricVisualizer:
         
         plt.legend()
         plt.tight_layout()
-        plt.savefig(f'defect_3d_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'defect_3d_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
 
     def plot_defect_regions(self, timestep_idx=-1, threshold=None, group=None):
         timesteps = self.parser.get_timesteps()
@@ -158,11 +165,14 @@ class CentroSymmetricVisualizer:
             all_x, all_y, all_z = self.parser.get_atoms_spatial_coordinates(data)
 
         defect_x, defect_y, defect_z = self.parser.get_atoms_spatial_coordinates(defect_data)
-        defect_centro_symmetric = defect_data[:, 5]
+        cs_values = self.parser.get_analysis_data('centro_symmetric', timestep_idx)
+        if group is not None and group != 'all':
+            cs_values = cs_values[group_indices]
+        defect_centro_symmetric = cs_values[defect_mask]
                 
         fig = plt.figure(figsize=(12, 10))
         ax = fig.add_subplot(111, projection='3d')
-        ax.scatter(all_x, all_y, all_z, c='lightgray', s=5, alpha=0.1)
+        ax.scatter(*downsample(all_x, all_y, all_z), c='lightgray', s=5, alpha=0.1)
         scatter = ax.scatter(defect_x, defect_y, defect_z, c=defect_centro_symmetric, cmap=self.centro_symmetric_cmap, s=30, alpha=1.0)
         plt.colorbar(scatter, ax=ax, label='Centro-Symmetric Parameter')
         ax.set_xlabel('X (Å)')
@@ -175,7 +185,8 @@ class CentroSymmetricVisualizer:
             title += f' - Group: {group}'
         ax.set_title(f'{title} (Timestep {current_timestep})')
         plt.tight_layout()
-        plt.savefig(f'defect_regions_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'defect_regions_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
 
     def plot_centro_symmetric_heatmaps(self, timestep_idx=-1):
         timesteps = self.parser.get_timesteps()
@@ -183,7 +194,7 @@ class CentroSymmetricVisualizer:
         current_timestep = timesteps[timestep_idx]
         
         x, y, z = self.parser.get_atoms_spatial_coordinates(data)
-        cs_values = data[:, 5]
+        cs_values = self.parser.get_analysis_data('centro_symmetric', timestep_idx)
         
         fig, axs = plt.subplots(1, 3, figsize=(18, 6))
         
@@ -208,7 +219,8 @@ class CentroSymmetricVisualizer:
         
         plt.suptitle(f'Centro-Symmetric Parameter Heat Maps (Timestep {current_timestep})', y=1.05)
         plt.tight_layout()
-        plt.savefig(f'cs_heatmaps_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'cs_heatmaps_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
 
     def plot_defect_by_groups(self, timestep_idx=-1):
         timesteps = self.parser.get_timesteps()
@@ -257,7 +269,8 @@ class CentroSymmetricVisualizer:
         add_labels(bar3)
         
         plt.tight_layout()
-        plt.savefig(f'defect_by_groups_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'defect_by_groups_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
 
     def plot_defect_profile(self, timestep_idx=-1, axis='z'):
         timesteps = self.parser.get_timesteps()
@@ -272,4 +285,5 @@ class CentroSymmetricVisualizer:
         ax2.set_xlabel(f'Position on {axis.upper()} Axis (Å)')
         ax2.set_ylabel('Average Centro Symmetric Value')
         ax2.grid(True, linestyle='--', alpha=0.7)
-        plt.savefig(f'defect_profile_{axis}_timestep_{current_timestep}.png', dpi=300)
\ No newline at end of file
+        plt.savefig(os.path.join(self.output_dir, f'defect_profile_{axis}_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
\ No newline at end of file
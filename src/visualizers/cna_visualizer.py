@@ -1,12 +1,14 @@
 from analyzers.cna_analyzer import CommonNeighborAnalysisAnalyzer
 from core.base_parser import BaseParser
 from matplotlib.colors import ListedColormap
+import os
 import matplotlib.pyplot as plt
 import numpy as np
 
 class CommonNeighborAnalysisVisualizer:
-    def __init__(self, parser: BaseParser):
+    def __init__(self, parser: BaseParser, output_dir: str = '.'):
         self.parser = parser
+        self.output_dir = output_dir
         self.analyzer = CommonNeighborAnalysisAnalyzer(parser)
 
         # TODO: move to analyzers/cna_analyzer
@@ -40,7 +42,7 @@ class CommonNeighborAnalysisVisualizer:
         plt.axis('equal')
         plt.title(f'Crystal Structure Distribution (Timestep {current_timestep})')
         plt.tight_layout()
-        plt.savefig(f'cna_distribution_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'cna_distribution_timestep_{current_timestep}.png'), dpi=300)
         plt.close()
 
     def plot_structure_evolution(self):
@@ -59,7 +61,7 @@ class CommonNeighborAnalysisVisualizer:
         plt.grid(True, linestyle='--', alpha=0.7)
         plt.legend()
         plt.tight_layout()
-        plt.savefig('structure_evolution.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, 'structure_evolution.png'), dpi=300)
         plt.close()
 
     def plot_structure_heatmap(self, timestep_idx=-1):
@@ -91,7 +93,7 @@ class CommonNeighborAnalysisVisualizer:
         
         plt.suptitle(f'Crystal Structure Distribution - Timestep {current_timestep}', y=1.05)
         plt.tight_layout()
-        plt.savefig(f'cna_spatial_distribution_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'cna_spatial_distribution_timestep_{current_timestep}.png'), dpi=300)
         plt.close()
 
     def plot_structure_comparison(self, timestep_idx1=0, timestep_idx2=-1):
@@ -127,5 +129,5 @@ class CommonNeighborAnalysisVisualizer:
         autolabel(rects2, comparison['percentages2'])
         
         fig.tight_layout()
-        plt.savefig(f'cna_comparison_timestep_{timestep1}_vs_{timestep2}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'cna_comparison_timestep_{timestep1}_vs_{timestep2}.png'), dpi=300)
         plt.close()
\ No newline at end of file
@@ -2,12 +2,14 @@ from analyzers.coordination_analyzer import CoordinationAnalyzer
 from core.base_parser import BaseParser
 from matplotlib.colors import ListedColormap
 from matplotlib.patches import Patch
+import os
 import matplotlib.pyplot as plt
 import numpy as np
 
 class CoordinationVisualizer:
-    def __init__(self, parser: BaseParser):
+    def __init__(self, parser: BaseParser, output_dir: str = '.'):
         self.parser = parser
+        self.output_dir = output_dir
         self.analyzer = CoordinationAnalyzer(parser)
         # TODO: move this to analyzers/coordination
         self.coord_colors = {
@@ -28,19 +30,12 @@ class CoordinationVisualizer:
         current_timestep = timesteps[timestep_idx]
         coord_values, counts, percentages = self.analyzer.get_coord_distribution(timestep_idx)
         plt.figure(figsize=(12, 7))
-        bars = plt.bar(coord_values, percentages, alpha=0.7)
-        for i, bar in enumerate(bars):
-            value = coord_values[i]
-            if value < 5:
-                bar.set_color(self.coord_colors['low'])
-            elif value < 9:
-                bar.set_color(self.coord_colors['surface'])
-            elif value < 12:
-                bar.set_color(self.coord_colors['defect'])
-            elif value == 12:
-                bar.set_color(self.coord_colors['perfect'])
-            else:
-                bar.set_color(self.coord_colors['excess'])
+        colors = np.select(
+            [coord_values < 5, coord_values < 9, coord_values < 12, coord_values == 12],
+            [self.coord_colors['low'], self.coord_colors['surface'], self.coord_colors['defect'], self.coord_colors['perfect']],
+            default=self.coord_colors['excess']
+        )
+        plt.bar(coord_values, percentages, color=colors, alpha=0.7)
         plt.xlabel('Coordination Number')
         plt.ylabel('Atoms Percentage (%)')
         plt.title(f'Distribution of Coordination Numbers (Timestep {current_timestep})')
@@ -62,7 +57,7 @@ class CoordinationVisualizer:
         plt.legend(handles=legend_elements, loc='upper left')
         
         plt.tight_layout()
-        plt.savefig(f'coordination_distribution_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'coordination_distribution_timestep_{current_timestep}.png'), dpi=300)
         plt.close()
 
     def plot_coord_evolution(self):
@@ -83,7 +78,7 @@ class CoordinationVisualizer:
         ax2.legend()
 
         plt.tight_layout()
-        plt.savefig('coordination_evolution.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, 'coordination_evolution.png'), dpi=300)
         plt.close()
 
     def plot_coord_spatial(self, timestep_idx=-1):
@@ -120,7 +115,7 @@ class CoordinationVisualizer:
         
         plt.suptitle(f'Coordination Spatial Distribution (Timestep {current_timestep})', y=1.05)
         plt.tight_layout()
-        plt.savefig(f'coordination_spatial_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'coordination_spatial_timestep_{current_timestep}.png'), dpi=300)
         plt.close()
 
     def plot_atom_classification(self, timestep_idx=-1):
@@ -158,7 +153,7 @@ class CoordinationVisualizer:
                     bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
         ax.legend()
         plt.tight_layout()
-        plt.savefig(f'atom_classification_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'atom_classification_timestep_{current_timestep}.png'), dpi=300)
         plt.close()
 
     def plot_coord_ranges(self, timestep_idx=-1):
@@ -191,7 +186,7 @@ class CoordinationVisualizer:
             ha='center', va='center', fontsize=9, bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
 
         plt.tight_layout()
-        plt.savefig(f'coordination_ranges_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'coordination_ranges_timestep_{current_timestep}.png'), dpi=300)
         plt.close()
 
     def plot_coord_comparison(self, timestep_idx1=0, timestep_idx2=-1):
@@ -248,5 +243,5 @@ class CoordinationVisualizer:
             plt.text(0.5, -0.15, f"Cambios principales:\n{change_summary}", transform=plt.gca().transAxes,
                     ha='center', va='center', fontsize=10, bbox=dict(boxstyle='round', facecolor='lightyellow', alpha=0.9))
         plt.tight_layout()
-        plt.savefig(f'coordination_comparison_{timestep1}_vs_{timestep2}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'coordination_comparison_{timestep1}_vs_{timestep2}.png'), dpi=300)
         plt.close()
\ No newline at end of file
@@ -1,11 +1,14 @@
 from analyzers.debris_analyzer import DebrisAnalyzer
 from core.base_parser import BaseParser
+from utilities.visualizer import downsample
+import os
 import matplotlib.pyplot as plt
 import numpy as np
 
 class DebrisVisualizer:
-    def __init__(self, parser: BaseParser):
+    def __init__(self, parser: BaseParser, output_dir: str = '.'):
         self.parser = parser
+        self.output_dir = output_dir
         self.analyzer = DebrisAnalyzer(parser)
 
     def plot_cluster_evolution(self):
@@ -25,7 +28,7 @@ class DebrisVisualizer:
         ax2.legend()
 
         plt.tight_layout()
-        plt.savefig('debris_cluster_evolution.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, 'debris_cluster_evolution.png'), dpi=300)
         plt.close()
 
     def plot_cluster_size_distribution(self, timestep_idx=-1, min_size=2, log_scale=True):
@@ -58,7 +61,7 @@ class DebrisVisualizer:
                     horizontalalignment='right', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
 
         plt.tight_layout()
-        plt.savefig(f'debris_size_distribution_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'debris_size_distribution_timestep_{current_timestep}.png'), dpi=300)
         plt.close()
 
     def plot_3d_cluster_visualization(self, timestep_idx=-1, min_size=5, max_clusters=10):
@@ -79,7 +82,7 @@ class DebrisVisualizer:
         z = atom_coords['z']
         cluster_ids_all = atom_coords['cluster_id']
         mask_others = ~np.isin(cluster_ids_all, cluster_ids)
-        ax.scatter(x[mask_others], y[mask_others], z[mask_others], s=10, alpha=0.1, c='gray', label='Others')
+        ax.scatter(*downsample(x[mask_others], y[mask_others], z[mask_others]), s=10, alpha=0.1, c='gray', label='Others')
         for cluster_id in cluster_ids:
             mask = cluster_ids_all == cluster_id
             if np.any(mask):
@@ -90,7 +93,7 @@ class DebrisVisualizer:
         ax.set_title(f'3D Visualization of Debris Clusters (Timestep {current_timestep})')
         ax.legend(loc='upper right', bbox_to_anchor=(1.3, 1.0))
         plt.tight_layout()
-        plt.savefig(f'debris_3d_visualization_timestep_{current_timestep}.png', dpi=300, bbox_inches='tight')
+        plt.savefig(os.path.join(self.output_dir, f'debris_3d_visualization_timestep_{current_timestep}.png'), dpi=300, bbox_inches='tight')
         plt.close()
     
     def plot_2d_projections(self, timestep_idx=-1, min_size=5, max_clusters=10):
@@ -112,7 +115,7 @@ class DebrisVisualizer:
 
         def plot_projection(ax, x_data, y_data, title):
             mask_others = ~np.isin(cluster_ids_all, cluster_ids)
-            ax.scatter(x_data[mask_others], y_data[mask_others], s=5, alpha=0.1, c='gray')
+            ax.scatter(*downsample(x_data[mask_others], y_data[mask_others]), s=5, alpha=0.1, c='gray')
             for cluster_id in cluster_ids:
                 mask = cluster_ids_all == cluster_id
                 if np.any(mask):
@@ -136,7 +139,7 @@ class DebrisVisualizer:
         fig.legend(handles, labels, loc='upper center', bbox_to_anchor=(0.5, 0), ncol=min(5, len(labels)))
         plt.suptitle(f'2D Projections of Debris Clusters (Timestep {current_timestep})', y=1.05)
         plt.tight_layout()
-        plt.savefig(f'debris_2d_projections_timestep_{current_timestep}.png', dpi=300, bbox_inches='tight')
+        plt.savefig(os.path.join(self.output_dir, f'debris_2d_projections_timestep_{current_timestep}.png'), dpi=300, bbox_inches='tight')
         plt.close()
 
     def plot_largest_clusters_info(self, timestep_idx=-1, n=5):
@@ -168,5 +171,5 @@ class DebrisVisualizer:
         table.scale(1.2, 1.5)
         plt.title(f'The {len(top_clusters)} Largest Clusters (Timestep {current_timestep})', y=0.9, fontsize=14)
         plt.tight_layout()
-        plt.savefig(f'largest_clusters_info_timestep_{current_timestep}.png', dpi=300, bbox_inches='tight')
+        plt.savefig(os.path.join(self.output_dir, f'largest_clusters_info_timestep_{current_timestep}.png'), dpi=300, bbox_inches='tight')
         plt.close()
\ No newline at end of file
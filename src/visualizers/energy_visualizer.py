@@ -1,13 +1,16 @@
 from core.base_parser import BaseParser
 from analyzers.energy_analyzer import EnergyAnalyzer
 from utilities.analyzer import get_atom_group_indices
+from utilities.visualizer import downsample
+import os
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 
 class EnergyVisualizer:
-    def __init__(self, parser: BaseParser):
+    def __init__(self, parser: BaseParser, output_dir: str = '.'):
         self.parser = parser
+        self.output_dir = output_dir
         self.analyzer = EnergyAnalyzer(parser)
 
         # Color maps for different energy types
@@ -19,27 +22,17 @@ class EnergyVisualizer:
     
     def plot_energy_distribution(self, timestep_idx=-1, group=None, energy_type='total'):
         timesteps = self.parser.get_timesteps()
-        data = self.parser.get_data(timestep_idx)
         current_timestep = timesteps[timestep_idx]
-        if group is not None and group != 'all':
-            group_indices = get_atom_group_indices(self.parser, timestep_idx)[group]
-            data = data[group_indices]
         if energy_type == 'kinetic':
-            # c_ke_mobile
-            energy_col = 5
             title_prefix = 'Kinetic'
             x_label = 'Kinetic Energy (eV)'
         elif energy_type == 'potential':
-            # c_pe_mobile
-            energy_col = 6
             title_prefix = 'Potential'
             x_label = 'Potential Energy (eV)'
         else:
-            # v_total_energy
-            energy_col = 7
             title_prefix = 'Total'
             x_label = 'Total Energy (eV)'
-        energy_values = data[:, energy_col]
+        energy_values = self.analyzer.get_group_energy(timestep_idx, group, energy_type)
         plt.figure(figsize=(10, 8))
         sns.histplot(energy_values, kde=True, bins=50)
         plt.axvline(np.mean(energy_values), color='red', linestyle='--', label=f'Mean: {np.mean(energy_values):.3f} eV')
@@ -63,7 +56,8 @@ class EnergyVisualizer:
         plt.grid(True, linestyle='--', alpha=0.7)
         plt.legend()
         plt.tight_layout()
-        plt.savefig(f'{energy_type}_energy_distribution_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'{energy_type}_energy_distribution_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
 
     def plot_energy_evolution(self, group=None, energy_type='total'):
         timesteps, average_energy, max_energy, min_energy, sum_energy = self.analyzer.get_energy_evolution(group, energy_type)
@@ -101,7 +95,8 @@ class EnergyVisualizer:
         
         plt.tight_layout()
         
-        plt.savefig(f'{energy_type}_energy_evolution.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'{energy_type}_energy_evolution.png'), dpi=300)
+        plt.close()
     
     def plot_energy_3d(self, timestep_idx=-1, group=None, energy_type='total'):
         timesteps = self.parser.get_timesteps()
@@ -115,19 +110,16 @@ class EnergyVisualizer:
         x, y, z = self.parser.get_atoms_spatial_coordinates(data)
         
         if energy_type == 'kinetic':
-            energy_col = 5
             title_prefix = 'Kinetic'
             cmap = self.energy_cmaps['kinetic']
         elif energy_type == 'potential':
-            energy_col = 6 
             title_prefix = 'Potential'
             cmap = self.energy_cmaps['potential']
         else:
-            energy_col = 7
             title_prefix = 'Total'
             cmap = self.energy_cmaps['total']
         
-        energy_values = data[:, energy_col]
+        energy_values = self.analyzer.get_group_energy(timestep_idx, group, energy_type)
         
         fig = plt.figure(figsize=(12, 10))
         ax = fig.add_subplot(111, projection='3d')
@@ -146,7 +138,8 @@ class EnergyVisualizer:
         
         plt.tight_layout()
         
-        plt.savefig(f'{energy_type}_energy_3d_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'{energy_type}_energy_3d_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
     
     def plot_high_energy_regions(self, timestep_idx=-1, threshold_percentile=95, energy_type='total', group=None):
         timesteps = self.parser.get_timesteps()
@@ -163,25 +156,22 @@ class EnergyVisualizer:
             all_x, all_y, all_z = self.parser.get_atoms_spatial_coordinates(data)
         high_x, high_y, high_z = self.parser.get_atoms_spatial_coordinates(high_energy_data)
         if energy_type == 'kinetic':
-            energy_col = 5
             title_prefix = 'Kinetic'
             cmap = self.energy_cmaps['kinetic']
             threshold_desc = f'>{threshold_percentile}%'
         elif energy_type == 'potential':
-            energy_col = 6  # c_pe_mobile
             title_prefix = 'Potential'
             cmap = self.energy_cmaps['potential']
             # For potential energy, lower is more stable
             threshold_desc = f'<{100-threshold_percentile}%'
         else:
-            energy_col = 7
             title_prefix = 'Total'
             cmap = self.energy_cmaps['total']
             threshold_desc = f'>{threshold_percentile}%'
-        high_energy_values = high_energy_data[:, energy_col]
+        high_energy_values = self.analyzer.get_group_energy(timestep_idx, group, energy_type)[high_energy_mask]
         fig = plt.figure(figsize=(12, 10))
         ax = fig.add_subplot(111, projection='3d')
-        ax.scatter(all_x, all_y, all_z, c='lightgray', s=5, alpha=0.1)
+        ax.scatter(*downsample(all_x, all_y, all_z), c='lightgray', s=5, alpha=0.1)
         # Plot high energy atoms with colors based on energy
         scatter = ax.scatter(high_x, high_y, high_z, c=high_energy_values, cmap=cmap, s=30, alpha=1.0)
         plt.colorbar(scatter, ax=ax, label=f'{title_prefix} Energy (eV)')
@@ -195,7 +185,8 @@ class EnergyVisualizer:
         ax.set_title(title)
         
         plt.tight_layout()
-        plt.savefig(f'high_{energy_type}_energy_regions_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'high_{energy_type}_energy_regions_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
     
     def plot_energy_heatmaps(self, timestep_idx=-1, energy_type='total'):
         timesteps = self.parser.get_timesteps()
@@ -204,18 +195,15 @@ class EnergyVisualizer:
         
         x, y, z = self.parser.get_atoms_spatial_coordinates(data)
         if energy_type == 'kinetic':
-            energy_col = 5
             title_prefix = 'Kinetic'
             cmap = self.energy_cmaps['kinetic']
         elif energy_type == 'potential':
-            energy_col = 6
             title_prefix = 'Potential'
             cmap = self.energy_cmaps['potential']
         else:  # total
-            energy_col = 7
             title_prefix = 'Total'
             cmap = self.energy_cmaps['total']
-        energy_values = data[:, energy_col]
+        energy_values = self.analyzer.get_group_energy(timestep_idx, energy_type=energy_type)
         fig, axs = plt.subplots(1, 3, figsize=(18, 6))
         bins = 50
                 
@@ -239,7 +227,8 @@ class EnergyVisualizer:
         
         plt.suptitle(f'{title_prefix} Energy Heat Maps - Timestep {current_timestep}', y=1.05)
         plt.tight_layout()
-        plt.savefig(f'{energy_type}_energy_heatmaps_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'{energy_type}_energy_heatmaps_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
     
     def plot_energy_by_groups(self, energy_type='total'):
         timesteps, nano_average, _, _, nano_sum = self.analyzer.get_energy_evolution('nanoparticle', energy_type)
@@ -275,7 +264,8 @@ class EnergyVisualizer:
         ax2.legend()
 
         plt.tight_layout()
-        plt.savefig(f'{energy_type}_energy_by_groups.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'{energy_type}_energy_by_groups.png'), dpi=300)
+        plt.close()
     
     def plot_energy_profile(self, timestep_idx=-1, axis='z', energy_type='total'):
         timesteps = self.parser.get_timesteps()
@@ -308,21 +298,17 @@ class EnergyVisualizer:
         
         plt.tight_layout()
         
-        plt.savefig(f'{energy_type}_energy_profile_{axis}_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'{energy_type}_energy_profile_{axis}_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
 
     def plot_energy_comparison(self, timestep_idx=-1, group=None):
         timesteps = self.parser.get_timesteps()
-        data = self.parser.get_data(timestep_idx)
         current_timestep = timesteps[timestep_idx]
         
-        if group is not None and group != 'all':
-            group_indices = get_atom_group_indices(self.parser, timestep_idx)[group]
-            data = data[group_indices]
-        
         # Extract energy values
-        ke_values = data[:, 5]
-        pe_values = data[:, 6] 
-        te_values = data[:, 7]
+        ke_values = self.analyzer.get_group_energy(timestep_idx, group, 'kinetic')
+        pe_values = self.analyzer.get_group_energy(timestep_idx, group, 'potential')
+        te_values = self.analyzer.get_group_energy(timestep_idx, group, 'total')
         
         # Create 3 side-by-side histograms
         fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(18, 6))
@@ -363,4 +349,5 @@ class EnergyVisualizer:
         plt.suptitle(title)
         plt.tight_layout()
         
-        plt.savefig(f'energy_comparison_timestep_{current_timestep}.png', dpi=300)
\ No newline at end of file
+        plt.savefig(os.path.join(self.output_dir, f'energy_comparison_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
\ No newline at end of file
@@ -1,12 +1,15 @@
 from analyzers.hotspot_analyzer import HotspotAnalyzer
 from core.base_parser import BaseParser
+from utilities.visualizer import downsample
 from mpl_toolkits.mplot3d import Axes3D
+import os
 import matplotlib.pyplot as plt
 import numpy as np
 
 class HotspotVisualizer:
-    def __init__(self, parser: BaseParser):
+    def __init__(self, parser: BaseParser, output_dir: str = '.'):
         self.parser = parser
+        self.output_dir = output_dir
         self.analyzer = HotspotAnalyzer(parser)
     
     def plot_energy_distribution(self, timestep_idx=-1):
@@ -39,7 +42,7 @@ class HotspotVisualizer:
                 verticalalignment='top', horizontalalignment='right', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
         
         plt.tight_layout()
-        plt.savefig(f'energy_distribution_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'energy_distribution_timestep_{current_timestep}.png'), dpi=300)
         plt.close()
     
     def plot_hotspot_evolution(self):
@@ -65,7 +68,7 @@ class HotspotVisualizer:
         ax3.grid(True, linestyle='--', alpha=0.7)
         
         plt.tight_layout()
-        plt.savefig('hotspot_evolution.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, 'hotspot_evolution.png'), dpi=300)
         plt.close()
 
     def plot_hotspot_spatial(self, timestep_idx=-1):
@@ -94,9 +97,10 @@ class HotspotVisualizer:
         cbar.set_label('Kinetic Energy (eV)')
 
         hotspot_mask = is_hotspot > 0
-        axs[1, 0].scatter(x, y, color='lightgray', s=2, alpha=0.3)
-        axs[1, 1].scatter(x, z, color='lightgray', s=2, alpha=0.3)
-        axs[1, 2].scatter(y, z, color='lightgray', s=2, alpha=0.3)
+        background_x, background_y, background_z = downsample(x, y, z)
+        axs[1, 0].scatter(background_x, background_y, color='lightgray', s=2, alpha=0.3)
+        axs[1, 1].scatter(background_x, background_z, color='lightgray', s=2, alpha=0.3)
+        axs[1, 2].scatter(background_y, background_z, color='lightgray', s=2, alpha=0.3)
 
         if np.any(hotspot_mask):
             axs[1, 0].scatter(x[hotspot_mask], y[hotspot_mask], color='red', s=20, alpha=0.8)
@@ -117,7 +121,7 @@ class HotspotVisualizer:
         
         plt.suptitle(f'Spatial Distribution of Energy and Hotspots (Timestep {current_timestep})', y=1.05, fontsize=16)
         plt.tight_layout()
-        plt.savefig(f'hotspot_spatial_distribution_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'hotspot_spatial_distribution_timestep_{current_timestep}.png'), dpi=300)
         plt.close()
     
     def plot_hotspot_clusters_3d(self, timestep_idx=-1):
@@ -131,7 +135,7 @@ class HotspotVisualizer:
         fig = plt.figure(figsize=(12, 10))
         ax = fig.add_subplot(111, projection='3d')
         background_mask = is_hotspot == 0
-        ax.scatter(x[background_mask], y[background_mask], z[background_mask], color='lightgray', s=1, alpha=0.1)
+        ax.scatter(*downsample(x[background_mask], y[background_mask], z[background_mask]), color='lightgray', s=1, alpha=0.1)
         colors = plt.cm.tab20(np.linspace(0, 1, len(clusters)))
         for i, (cluster_id, atom_indices) in enumerate(clusters.items()):
             color = colors[i % len(colors)]
@@ -150,7 +154,7 @@ class HotspotVisualizer:
             ax.text2D(0.05, 0.95, f'Total clusters: {len(clusters)}', transform=ax.transAxes, bbox=dict(boxstyle='round', facecolor='white', alpha=0.7))
         
         plt.tight_layout()
-        plt.savefig(f'hotspot_clusters_3d_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'hotspot_clusters_3d_timestep_{current_timestep}.png'), dpi=300)
         plt.close()
     
     def plot_hotspot_heatmap(self, timestep_idx=-1, bins=50):
@@ -185,5 +189,5 @@ class HotspotVisualizer:
         
         plt.suptitle(f'Hotspot Concentration Heatmaps (Timestep {current_timestep})', y=1.05)
         plt.tight_layout()
-        plt.savefig(f'hotspot_heatmap_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'hotspot_heatmap_timestep_{current_timestep}.png'), dpi=300)
         plt.close()
\ No newline at end of file
@@ -1,14 +1,17 @@
 from analyzers.ptm_analyzer import PTMAnalyzer
 from core.base_parser import BaseParser
 from utilities.analyzer import get_data_from_coord_axis, get_atom_group_indices
+from utilities.kernels import min_max
+import os
 import matplotlib.animation as animation
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
 
 class PTMVisualizer:
-    def __init__(self, parser: BaseParser):
+    def __init__(self, parser: BaseParser, output_dir: str = '.'):
         self.parser = parser
+        self.output_dir = output_dir
         self.analyzer = PTMAnalyzer(parser)
 
     def plot_structure_distribution(self, timestep_idx=-1, group=None):
@@ -40,7 +43,8 @@ class PTMVisualizer:
         plt.title(title)
         plt.grid(True, linestyle='--', alpha=0.7, axis='y')
         plt.tight_layout()
-        plt.savefig(f'structure_distribution_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'structure_distribution_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
     
     def plot_structure_evolution(self, group=None):
         timesteps, evolution = self.analyzer.get_structure_evolution(group)
@@ -62,20 +66,22 @@ class PTMVisualizer:
         plt.grid(True, linestyle='--', alpha=0.7)
         plt.legend()
         plt.tight_layout()
-        plt.savefig('structure_evolution.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, 'structure_evolution.png'), dpi=300)
+        plt.close()
     
     def plot_3d_structures(self, timestep_idx=-1, group=None, filter_rmsd=None):
         timesteps = self.parser.get_timesteps()
         data = self.parser.get_data(timestep_idx)
+        # c_ptm[1] and c_ptm[2]
+        structure_types, rmsd_values = self.parser.get_analysis_data('ptm', timestep_idx)[:2]
         current_timestep = timesteps[timestep_idx]
         if group is not None and group != 'all':
             group_indices = get_atom_group_indices(self.parser, timestep_idx)[group]
             data = data[group_indices]
-        x, y, z = self.parser.get_atoms_spatial_coordinates()
-        # c_ptm[1]
-        structure_types = data[:, 5].astype(int)
-        # c_ptm[2]
-        rmsd_values = data[:, 6]
+            structure_types = structure_types[group_indices]
+            rmsd_values = rmsd_values[group_indices]
+        x, y, z = self.parser.get_atoms_spatial_coordinates(data)
+        structure_types = structure_types.astype(np.uint8)
         # filter by rmsd if specified
         if filter_rmsd is not None:
             valid_indices = ~np.isinf(rmsd_values) & (rmsd_values <= filter_rmsd)
@@ -101,16 +107,16 @@ class PTMVisualizer:
         ax.set_title(title)
         ax.legend()
         plt.tight_layout()
-        plt.savefig(f'structures_3d_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'structures_3d_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
 
     def plot_rmsd_distribution(self, timestep_idx=-1, group=None, max_rmsd=None):
         timesteps = self.parser.get_timesteps()
-        data = self.parser.get_data(timestep_idx)
+        rmsd_values = self.parser.get_analysis_data('ptm', timestep_idx)[1]
         current_timestep = timesteps[timestep_idx]
         if group is not None and group != 'all':
             group_indices = get_atom_group_indices(self.parser, timestep_idx)[group]
-            data = data[group_indices]
-        rmsd_values = data[:, 6]
+            rmsd_values = rmsd_values[group_indices]
         valid_rmsd = rmsd_values[~np.isinf(rmsd_values) & ~np.isnan(rmsd_values)]
         if max_rmsd is not None:
             valid_rmsd = valid_rmsd[valid_rmsd <= max_rmsd]
@@ -141,40 +147,36 @@ class PTMVisualizer:
         plt.grid(True, linestyle='--', alpha=0.7)
         plt.legend()
         plt.tight_layout()
-        plt.savefig(f'rmsd_distribution_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'rmsd_distribution_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
     
     def plot_structure_by_layer(self, timestep_idx=-1, axis='z', n_layers=10):
         timesteps = self.parser.get_timesteps()
         data = self.parser.get_data(timestep_idx)
         current_timestep = timesteps[timestep_idx]
-        atoms_spatial_coordinates = self.parser.get_atoms_spatial_coordinates()
+        atoms_spatial_coordinates = self.parser.get_atoms_spatial_coordinates(data)
         coords = get_data_from_coord_axis(axis, atoms_spatial_coordinates)
         axis_name = axis.upper()
-        structure_types = data[:, 5].astype(int)
-        min_coord = np.min(coords)
-        max_coord = np.max(coords)
+        structure_types = self.parser.get_analysis_data('ptm', timestep_idx)[0].astype(np.uint8)
+        min_coord, max_coord = min_max(coords)
         layer_edges = np.linspace(min_coord, max_coord, n_layers + 1)
         layer_centers = [(layer_edges[i] + layer_edges[i + 1]) / 2 for i in range(n_layers)]
-        structures_by_layer = []
-        for i in range(n_layers):
-            layer_min = layer_edges[i]
-            layer_max = layer_edges[i + 1]
-            layer_mask = (coords >= layer_min) & (coords < layer_max)
-            layer_structures = structure_types[layer_mask]
-            layer_counts = {}
-            for struct_type, name in self.analyzer.structure_names.items():
-                layer_counts[name] = np.sum(layer_structures == struct_type)
-            structures_by_layer.append(layer_counts)
+        # Layer i holds layer_edges[i] <= coord < layer_edges[i + 1] (the
+        # upper edge belongs to the last layer); one bincount over (layer,
+        # structure) pairs counts every layer at once
+        layers = np.searchsorted(layer_edges, coords, side='right') - 1
+        np.clip(layers, 0, n_layers - 1, out=layers)
+        n_types = max(self.analyzer.structure_names) + 1
+        valid = structure_types < n_types
+        structures_by_layer = np.bincount(
+            layers[valid] * n_types + structure_types[valid],
+            minlength=n_layers * n_types
+        ).reshape(n_layers, n_types)
         plt.figure(figsize=(12, 8))
         bottoms = np.zeros(n_layers)
-        for name in self.analyzer.structure_names.values():
-            counts = [layer_counts[name] for layer_counts in structures_by_layer]
-            for key, value in self.analyzer.structure_names.items():
-                if value == name:
-                    color = self.analyzer.structure_colors[key]
-                    break
-            else:
-                color = 'gray'
+        for struct_type, name in self.analyzer.structure_names.items():
+            counts = structures_by_layer[:, struct_type]
+            color = self.analyzer.structure_colors.get(struct_type, 'gray')
             plt.bar(layer_centers, counts, bottom=bottoms, label=name, color=color, width=(layer_edges[1] - layer_edges[0]) * 0.8)
             bottoms += counts
         plt.xlabel(f'Coordinate {axis_name} (Å)')
@@ -183,7 +185,8 @@ class PTMVisualizer:
         plt.grid(True, linestyle='--', alpha=0.7, axis='y')
         plt.legend()
         plt.tight_layout()
-        plt.savefig(f'structures_by_layer_{axis}_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'structures_by_layer_{axis}_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
     
     def create_ptm_animation(self, interval=200):
         timesteps = self.parser.get_timesteps()
@@ -195,10 +198,10 @@ class PTMVisualizer:
 
         def update(frame):
             ax.clear()
-            data = self.parser.get_data()[frame]
+            data = self.parser.get_data(frame)
             current_timestep = timesteps[frame]
-            x, y, z = self.parser.get_atoms_spatial_coordinates()
-            structure_types = data[:, 5].astype(int)
+            x, y, z = self.parser.get_atoms_spatial_coordinates(data)
+            structure_types = self.parser.get_analysis_data('ptm', frame)[0].astype(np.uint8)
             for struct_type, name in self.analyzer.structure_names.items():
                 mask = structure_types == struct_type
                 if np.any(mask):
@@ -213,7 +216,7 @@ class PTMVisualizer:
 
         anim = animation.FuncAnimation(fig, update, frames=len(timesteps), interval=interval, blit=False)
         try:
-            anim.save('ptm_animation.gif', writer='pillow', fps=1000/interval)
+            anim.save(os.path.join(self.output_dir, 'ptm_animation.gif'), writer='pillow', fps=1000/interval)
         except Exception as e:
             print(f'Error saving animation: {e}')
         plt.close(fig)
\ No newline at end of file
@@ -1,24 +1,26 @@
 from core.base_parser import BaseParser
 from analyzers.velocity_squared_analyzer import VelocitySquaredAnalyzer
 from utilities.analyzer import get_atom_group_indices
+from utilities.visualizer import downsample
+import os
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
 
 class VelocitySquaredVisualizer:
-    def __init__(self, parser: BaseParser):
+    def __init__(self, parser: BaseParser, output_dir: str = '.'):
         self.parser = parser
+        self.output_dir = output_dir
         self.analyzer = VelocitySquaredAnalyzer(parser)
         self.temp_cmap = 'plasma'
     
     def plot_temperature_distribution(self, timestep_idx=-1, group=None):
         timesteps = self.parser.get_timesteps()
-        data = self.parser.get_data(timestep_idx)
+        velocity_squared = self.parser.get_analysis_data('velocity_squared', timestep_idx)
         current_timestep = timesteps[timestep_idx]
         if group is not None and group != 'all':
             group_indices = get_atom_group_indices(self.parser, timestep_idx)[group]
-            data = data[group_indices]
-        velocity_squared = data[:, 5]
+            velocity_squared = velocity_squared[group_indices]
         temperature = self.analyzer.velocity_to_temperature(velocity_squared)
         plt.figure(figsize=(10, 8))
         sns.histplot(temperature, kde=True, bins=50)
@@ -40,7 +42,8 @@ class VelocitySquaredVisualizer:
         plt.grid(True, linestyle='--', alpha=0.7)
         plt.legend()
         plt.tight_layout()
-        plt.savefig(f'temperature_distribution_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'temperature_distribution_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
 
     def plot_temperature_evolution(self, group=None):
         timesteps, average_temperature, max_temperature, min_temperature = self.analyzer.get_temperature_evolution(group)
@@ -58,17 +61,19 @@ class VelocitySquaredVisualizer:
         plt.grid(True, linestyle='--', alpha=0.7)
         plt.legend()
         plt.tight_layout()
-        plt.savefig('temperature_evolution.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, 'temperature_evolution.png'), dpi=300)
+        plt.close()
     
     def plot_temperature_3d(self, timestep_idx=-1, group=None):
         timesteps = self.parser.get_timesteps()
         data = self.parser.get_data(timestep_idx)
+        velocity_squared = self.parser.get_analysis_data('velocity_squared', timestep_idx)
         current_timestep = timesteps[timestep_idx]
         if group is not None and group != 'all':
             group_indices = get_atom_group_indices(self.parser, timestep_idx)[group]
             data = data[group_indices]
+            velocity_squared = velocity_squared[group_indices]
         x, y, z = self.parser.get_atoms_spatial_coordinates(data)
-        velocity_squared = data[:, 5]
         temperature = self.analyzer.velocity_to_temperature(velocity_squared)
         fig = plt.figure(figsize=(12, 10))
         ax = fig.add_subplot(111, projection='3d')
@@ -82,26 +87,30 @@ class VelocitySquaredVisualizer:
             title += f' - Group: {group}'
         ax.set_title(title)
         plt.tight_layout()
-        plt.savefig(f'temperature_3d_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'temperature_3d_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
     
     def plot_hot_spots(self, timestep_idx=-1, threshold_percentile=95, group=None):
         timesteps = self.parser.get_timesteps()
         current_timestep = timesteps[timestep_idx]
         data = self.parser.get_data(timestep_idx)
+        velocity_squared = self.parser.get_analysis_data('velocity_squared', timestep_idx)
         if group is not None and group != 'all':
             group_indices = get_atom_group_indices(self.parser, timestep_idx)[group]
             filtered_data = data[group_indices]
+            velocity_squared = velocity_squared[group_indices]
             hot_spots_data, hot_spots_mask = self.analyzer.get_hot_spots(timestep_idx, threshold_percentile, group)
             all_x, all_y, all_z = self.parser.get_atoms_spatial_coordinates(filtered_data)
         else:
             hot_spots_data, hot_spots_mask = self.analyzer.get_hot_spots(timestep_idx, threshold_percentile)
             all_x, all_y, all_z = self.parser.get_atoms_spatial_coordinates(data)
         hot_x, hot_y, hot_z = self.parser.get_atoms_spatial_coordinates(hot_spots_data)
-        hot_velocity_squared = hot_spots_data[:, 5]
+        # The mask is relative to the group-filtered atoms
+        hot_velocity_squared = velocity_squared[hot_spots_mask]
         hot_temperature = self.analyzer.velocity_to_temperature(hot_velocity_squared)
         fig = plt.figure(figsize=(12, 10))
         ax = fig.add_subplot(111, projection='3d')
-        ax.scatter(all_x, all_y, all_z, c='lightgray', s=5, alpha=0.1)
+        ax.scatter(*downsample(all_x, all_y, all_z), c='lightgray', s=5, alpha=0.1)
         scatter = ax.scatter(hot_x, hot_y, hot_z, c=hot_temperature, cmap=self.temp_cmap, s=30, alpha=1.0)
         plt.colorbar(scatter, ax=ax, label='Temperature (K)')
         ax.set_xlabel('X (Å)')
@@ -112,14 +121,15 @@ class VelocitySquaredVisualizer:
             title += f' - Group: {group}'
         ax.set_title(title)
         plt.tight_layout()
-        plt.savefig(f'hot_spots_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'hot_spots_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
     
     def plot_temperature_heatmaps(self, timestep_idx=-1):
         timesteps = self.parser.get_timesteps()
         data = self.parser.get_data(timestep_idx)
         current_timestep = timesteps[timestep_idx]
         x, y, z = self.parser.get_atoms_spatial_coordinates(data)
-        velocity_squared = data[:, 5]
+        velocity_squared = self.parser.get_analysis_data('velocity_squared', timestep_idx)
         temperature = self.analyzer.velocity_to_temperature(velocity_squared)
         fig, axs = plt.subplots(1, 3, figsize=(18, 6))
         bins = 50
@@ -142,7 +152,8 @@ class VelocitySquaredVisualizer:
         fig.colorbar(hyz, ax=axs[2], label='Average Temperature (K)')
 
         plt.suptitle(f'Temperature Heat Steps - Timestep {current_timestep}', y=1.05)
-        plt.savefig(f'temperature_heatmaps_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'temperature_heatmaps_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
         
     def plot_temperature_by_groups(self):
         timesteps, nano_average, nano_max, nano_min = self.analyzer.get_temperature_evolution('nanoparticle')
@@ -162,7 +173,8 @@ class VelocitySquaredVisualizer:
         plt.grid(True, linestyle='--', alpha=0.7)
         plt.legend()
         plt.tight_layout()
-        plt.savefig('temperature_by_groups.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, 'temperature_by_groups.png'), dpi=300)
+        plt.close()
     
     def plot_temperature_gradient(self, timestep_idx=-1, axis='z'):
         timesteps = self.parser.get_timesteps()
@@ -175,4 +187,5 @@ class VelocitySquaredVisualizer:
         plt.title(f'Temperature gradient along axis {axis.upper()} (Timestep {current_timestep})')
         plt.grid(True, linestyle='--', alpha=0.7)
         plt.tight_layout()
-        plt.savefig(f'temperature_gradient_{axis}_timestep_{current_timestep}.png', dpi=300)
\ No newline at end of file
+        plt.savefig(os.path.join(self.output_dir, f'temperature_gradient_{axis}_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
\ No newline at end of file
@@ -1,13 +1,17 @@
 from core.base_parser import BaseParser
 from analyzers.vonmises_analyzer import VonMisesAnalyzer
 from utilities.analyzer import get_data_from_coord_axis, get_atom_group_indices
+from utilities.kernels import min_max
+from utilities.visualizer import downsample
+import os
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
 
 class VonmisesVisualizer:
-    def __init__(self, parser: BaseParser):
+    def __init__(self, parser: BaseParser, output_dir: str = '.'):
         self.parser = parser
+        self.output_dir = output_dir
         self.analyzer = VonMisesAnalyzer(parser)
 
     def plot_stress_evolution(self):
@@ -24,7 +28,8 @@ class VonmisesVisualizer:
         plt.grid(True, linestyle='--', alpha=0.7)
         plt.legend()
         plt.tight_layout()
-        plt.savefig('stress_evolution.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, 'stress_evolution.png'), dpi=300)
+        plt.close()
 
     def plot_stress_heatmaps(self, timestep_idx=-1):
         timesteps = self.parser.get_timesteps()
@@ -32,7 +37,7 @@ class VonmisesVisualizer:
         current_timestep = timesteps[timestep_idx]
 
         x, y, z = self.parser.get_atoms_spatial_coordinates(data)
-        stress = data[:, 5]
+        stress = self.parser.get_analysis_data('vonmises', timestep_idx)
 
         fig, axs = plt.subplots(1, 3, figsize=(18, 6))
         bins = 50
@@ -57,12 +62,12 @@ class VonmisesVisualizer:
 
         plt.suptitle(f'von Mises Stress Heat Maps - Timestep {current_timestep} - Timestep {current_timestep}', y=1.05)
         plt.tight_layout()
-        plt.savefig(f'stress_heatmaps_timesteps_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'stress_heatmaps_timesteps_{current_timestep}.png'), dpi=300)
+        plt.close()
 
     def plot_stress_distribution(self, timestep_idx=-1):
         timesteps = self.parser.get_timesteps()
-        data = self.parser.get_data(timestep_idx)
-        stress = data[:, 5]
+        stress = self.parser.get_analysis_data('vonmises', timestep_idx)
         current_timestep = timesteps[timestep_idx]
 
         plt.figure(figsize=(10, 8))
@@ -85,7 +90,8 @@ class VonmisesVisualizer:
                  verticalalignment='top', horizontalalignment='right', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
 
         plt.tight_layout()
-        plt.savefig(f'stress_distribution_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'stress_distribution_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
 
     def plot_stress_by_groups(self):
         '''
@@ -108,19 +114,21 @@ class VonmisesVisualizer:
         plt.grid(True, linestyle='--', alpha=0.7)
         plt.legend()
         plt.tight_layout()
-        plt.savefig('stress_by_group.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, 'stress_by_group.png'), dpi=300)
+        plt.close()
 
     def plot_stress_3d(self, timestep_idx=-1, group=None, percentile_threshold=None):
         timesteps = self.parser.get_timesteps()
         data = self.parser.get_data(timestep_idx)
+        stress = self.parser.get_analysis_data('vonmises', timestep_idx)
         current_timestep = timesteps[timestep_idx]
 
         if group is not None and group != 'all':
             group_indices = get_atom_group_indices(self.parser, timestep_idx)[group]
             data = data[group_indices]
+            stress = stress[group_indices]
 
         x, y, z = self.parser.get_atoms_spatial_coordinates(data)
-        stress = data[:, 5]
 
         fig = plt.figure(figsize=(12, 10))
         ax = fig.add_subplot(111, projection='3d')
@@ -128,7 +136,7 @@ class VonmisesVisualizer:
         if percentile_threshold is not None:
             threshold = np.percentile(stress, percentile_threshold)
             high_stress_mask = stress >= threshold
-            ax.scatter(x, y, z, c='lightgray', s=5, alpha=0.1)
+            ax.scatter(*downsample(x, y, z), c='lightgray', s=5, alpha=0.1)
             scatter = ax.scatter(x[high_stress_mask], y[high_stress_mask], z[high_stress_mask],
                         c=stress[high_stress_mask], cmap='hot', s=30, alpha=1.0)
             title = f'High Stress Regions (>{percentile_threshold}%) - Timestep {current_timestep}'
@@ -146,7 +154,8 @@ class VonmisesVisualizer:
         ax.set_zlabel('Z (Å)')
         ax.set_title(title)
         plt.tight_layout()
-        plt.savefig(f'stress_3d_timestep_{current_timestep}.png', dpi=300)
+        plt.savefig(os.path.join(self.output_dir, f'stress_3d_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
 
     def plot_stress_by_layer(self, timestep_idx=-1, axis='z', layers_to_create=10):
         timesteps = self.parser.get_timesteps()
@@ -156,55 +165,47 @@ class VonmisesVisualizer:
         atoms_spatial_coordinates = self.parser.get_atoms_spatial_coordinates(data)
         coords = get_data_from_coord_axis(axis, atoms_spatial_coordinates)
         axis_name = axis.upper()
-        stress = data[:, 5]
+        stress = self.parser.get_analysis_data('vonmises', timestep_idx)
         
-        min_coord = np.min(coords)
-        max_coord = np.max(coords)
+        min_coord, max_coord = min_max(coords)
         layer_edges = np.linspace(min_coord, max_coord, layers_to_create + 1)
+        layer_centers = 0.5 * (layer_edges[1:] + layer_edges[:-1])
+
+        # Assign every atom to its layer once and aggregate all layers together
+        # (the upper edge belongs to the last layer)
+        layer_ids = np.searchsorted(layer_edges, coords, side='right') - 1
+        np.clip(layer_ids, 0, layers_to_create - 1, out=layer_ids)
+        atoms_in_layer = np.bincount(layer_ids, minlength=layers_to_create)
+        stress_sum = np.bincount(layer_ids, weights=stress, minlength=layers_to_create)
+        max_stress_by_layer = np.full(layers_to_create, -np.inf)
+        min_stress_by_layer = np.full(layers_to_create, np.inf)
+        np.maximum.at(max_stress_by_layer, layer_ids, stress)
+        np.minimum.at(min_stress_by_layer, layer_ids, stress)
+
+        # Empty layers report 0
+        empty = atoms_in_layer == 0
+        average_stress_by_layer = np.divide(stress_sum, atoms_in_layer, out=np.zeros(layers_to_create), where=~empty)
+        max_stress_by_layer[empty] = 0
+        min_stress_by_layer[empty] = 0
+
+        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
+
+        ax1.plot(layer_centers, average_stress_by_layer, 'b-o', label='Average Stress')
+        ax1.plot(layer_centers, max_stress_by_layer, 'r-^', label='Maximum Stress')
+        ax1.fill_between(layer_centers, min_stress_by_layer, max_stress_by_layer, color='blue', alpha=0.2)
+
+        ax1.set_xlabel(f'Coordinate {axis_name} (Å)')
+        ax1.set_ylabel(f'von Mises Stress')
+        ax1.set_title(f'Stress by Layer - Axis {axis_name} (Timestep {current_timestep})')
+        ax1.grid(True, linestyle='--', alpha=0.7)
+        ax1.legend()
+
+        ax2.bar(layer_centers, atoms_in_layer, width=(layer_edges[1] - layer_edges[0]) * 0.8, alpha=0.7)
+        ax2.set_xlabel(f'Coordinate {axis_name} (Å)')
+        ax2.set_ylabel('Number of Atoms')
+        ax2.set_title('Distribution of Atoms per Layer')
+        ax2.grid(True, linestyle='--', alpha=0.7)
 
-        layer_centers = []
-        average_stress_by_layer = []
-        max_stress_by_layer = []
-        min_stress_by_layer = []
-        atoms_in_layer = []
-
-        for i in range(layers_to_create):
-            layer_min = layer_edges[i]
-            layer_max = layer_edges[i + 1]
-            layer_center = (layer_min + layer_max) / 2
-
-            layer_mask = (coords >= layer_min) & (coords < layer_max)
-            layer_stress = stress[layer_mask]
-
-            layer_centers.append(layer_center)
-            atoms_in_layer.append(np.sum(layer_mask))
-
-            if len(layer_stress) > 0:
-                average_stress_by_layer.append(np.mean(layer_stress))
-                max_stress_by_layer.append(np.max(layer_stress))
-                min_stress_by_layer.append(np.min(layer_stress))
-            else:
-                average_stress_by_layer.append(0)
-                max_stress_by_layer.append(0)
-                min_stress_by_layer.append(0)
-            
-            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
-
-            ax1.plot(layer_centers, average_stress_by_layer, 'b-o', label='Average Stress')
-            ax1.plot(layer_centers, max_stress_by_layer, 'r-^', label='Maximum Stress')
-            ax1.fill_between(layer_centers, min_stress_by_layer, max_stress_by_layer, color='blue', alpha=0.2)
-
-            ax1.set_xlabel(f'Coordinate {axis_name} (Å)')
-            ax1.set_ylabel(f'von Mises Stress')
-            ax1.set_title(f'Stress by Layer - Axis {axis_name} (Timestep {current_timestep})')
-            ax1.grid(True, linestyle='--', alpha=0.7)
-            ax1.legend()
-
-            ax2.bar(layer_centers, atoms_in_layer, width=(layer_edges[1] - layer_edges[0]) * 0.8, alpha=0.7)
-            ax2.set_xlabel(f'Coordinate {axis_name} (Å)')
-            ax2.set_ylabel('Number of Atoms')
-            ax2.set_title('Distribution of Atoms per Layer')
-            ax2.grid(True, linestyle='--', alpha=0.7)
-
-            plt.tight_layout()
-            plt.savefig(f'stress_by_layer_{axis}_timestep_{current_timestep}.png', dpi=300)
\ No newline at end of file
+        plt.tight_layout()
+        plt.savefig(os.path.join(self.output_dir, f'stress_by_layer_{axis}_timestep_{current_timestep}.png'), dpi=300)
+        plt.close()
\ No newline at end of file
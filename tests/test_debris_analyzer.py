@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('cupy')
+
+from analyzers.debris_analyzer import DebrisAnalyzer
+
+class ClusterParser:
+    '''
+    Minimal parser stand-in serving one cluster column per timestep.
+    '''
+    def __init__(self, *frames):
+        self.frames = [np.asarray(frame, dtype=np.int32) for frame in frames]
+
+    def get_analysis_data(self, analysis_type, timestep_idx=-1):
+        assert analysis_type == 'cluster'
+        return self.frames[timestep_idx]
+
+def test_largest_clusters_of_empty_frame():
+    analyzer = DebrisAnalyzer(ClusterParser([]))
+    assert analyzer.get_largest_clusters(0, n=5) == []
+
+def test_largest_clusters_keep_lowest_ids_on_ties():
+    # Cluster 0 holds unclustered atoms and is never reported
+    analyzer = DebrisAnalyzer(ClusterParser([0, 0, 0, 1, 2, 2, 3, 3, 4]))
+    assert analyzer.get_largest_clusters(0, n=2) == [(2, 2), (3, 2)]
+    assert analyzer.get_largest_clusters(0, n=3) == [(2, 2), (3, 2), (1, 1)]